@@ -65,12 +65,28 @@ def nssb(c, d):
     return int(t), int(b)  # top switch, bottom switch
 
 
-def dem(X, Rng, Nb):
+def switching_sequence(N, Nb, seed=None):
+    """
+    Random switching sequence (white), one row of 2*Nb - 1 bits per sample.
+
+    seed
+        seed for a dedicated generator, or None to draw from the global
+        NumPy random state (np.random.seed(), as set by run_me)
+    """
+
+    if seed is None:
+        return np.random.randint(2, size=(N, 2*Nb-1))
+    return np.random.default_rng(seed).integers(2, size=(N, 2*Nb-1))
+
+
+def dem(X, Rng, Nb, seed=None):
     """
     X
         input signal
     Rng, N
         quantiser params. (for re-quantisation and code generation)
+    seed
+        seed for the random switching sequence (None - global NumPy random state)
     """
     
     # DEM code input range
@@ -92,6 +108,9 @@ def dem(X, Rng, Nb):
 
     # from lin_method_dem import ssb, nssb # 
 
+    # random switching sequence (white), one row per sample
+    D = switching_sequence(X.size, Nb, seed)
+
     for i in range(0, X.size):
         w = X[i]
         
@@ -107,7 +126,7 @@ def dem(X, Rng, Nb):
         c1 = c # initial switching block input
         
         # random switching sequence
-        d = np.random.randint(2, size=2*Nb-1) # white
+        d = D[i]
         
         for j in range(0, Nb-1):
             Sst, Ssb = ssb(c1, d[2*j]) # segmenting switching
@@ -129,4 +148,83 @@ def dem(X, Rng, Nb):
         C[:, i] = np.sum(Ss*Ks, 1)
         #Csum[i] = np.sum(C[:, i]) # (verification)
 
-    return C
\ No newline at end of file
+    return C
+
+
+def dem_vec(X, Rng, Nb, seed=None):
+    """
+    Vectorised DEM, processing all samples at once for each level of the
+    switching tree. Same arguments as dem(), and identical codes for the same seed
+    (or the same global random state with seed=None).
+    """
+
+    # DEM code input range
+    M = 2*(2**Nb - 1)
+    cmin = 2**(Nb-1) - 1
+    Qseg = Rng/(M - 2*cmin)  # segmented step-size (LSB)
+
+    cin = 2**(Nb-1)  # when input it bipolar an offset is needed
+
+    # Re-quantizer for segmented DAC (mid-tread) and DEM codes
+    c1 = np.floor(np.asarray(X)/Qseg + 0.5).astype(int) + cin + cmin
+
+    # random switching sequence (white), one row per sample
+    D = switching_sequence(c1.size, Nb, seed).astype(bool)
+
+    C = np.zeros((2, c1.size)).astype(int)  # individual DAC codes (1 ch. per row)
+    odd = np.zeros(c1.size).astype(bool)
+    s = np.zeros(c1.size).astype(int)
+
+    for j in range(0, Nb):
+        if j < Nb-1:
+            # segmenting switching
+            np.not_equal(c1 % 2, 0, out=odd)
+            s[:] = np.where(odd, 0, np.where(D[:, 2*j], 1, -1))
+            c2 = 1 + s  # bottom switch, feed to next switching block
+            c1 = (c1 - 1 - s)//2  # top switch, save for next iteration
+            d = D[:, 2*j+1]
+        else:
+            c2 = c1
+            d = D[:, -1]
+
+        # non-segmenting switching
+        np.not_equal(c2 % 2, 0, out=odd)
+        s[:] = np.where(odd, np.where(d, 1, -1), 0)
+        C[0, :] += ((c2 - s)//2) << j
+        C[1, :] += ((c2 + s)//2) << j
+
+    return C
+
+
+def main():
+    """
+    Test the vectorised DEM for identical codes and compare throughput (samples/second).
+    """
+    import time
+
+    Nb = 6
+    Rng = 2
+    Fs = 1e6
+    t = np.arange(0, 5/5e3, 1/Fs)
+    X = 0.99*(Rng/2)*np.sin(2*np.pi*5e3*t)
+
+    t0 = time.perf_counter()
+    C_ref = dem(X, Rng, Nb, seed=1)
+    rate_loop = X.size/(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    C_vec = dem_vec(X, Rng, Nb, seed=1)
+    rate_vec = X.size/(time.perf_counter() - t0)
+
+    print(f'loop: {rate_loop:.3g} samples/s, vectorised: {rate_vec:.3g} samples/s, '
+          f'identical codes: {np.array_equal(C_ref, C_vec)}')
+    print(f'speed-up: {rate_vec/rate_loop:.1f}x')
+
+    np.random.seed(1)
+    C_ref = dem(X, Rng, Nb)
+    np.random.seed(1)
+    C_vec = dem_vec(X, Rng, Nb)
+    print(f'global random state (seed=None), identical codes: {np.array_equal(C_ref, C_vec)}')
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,10 @@
 import numpy as np
 from scipy import signal, linalg
 import math
+import sys
 from utils.balreal import balreal
+from LM.lin_method_ilc import learning_filters
+from utils.static_dac_model import generate_dac_output
 import tqdm
 
 class DSM_ILC:
@@ -65,7 +68,7 @@ class DSM_ILC:
         ColumnVec = np.reshape(ColumnVec, (len(ColumnVec),1))
 
         # Output Matrix
-        G = linalg.toeplitz(ColumnVec, RowVec)
+        G = linalg.toeplitz(ColumnVec.ravel(), RowVec.ravel())
 
         # Q-filter and Learning Matrices
         Subinverse11 =  G.transpose() @ We @ G 
@@ -95,6 +98,14 @@ class DSM_ILC:
         return Q, L, G
     
  
+    def learningFilters(self, len_X, we, wf, wdf, im):
+        """ Q-filter, learning and output filters for scalar tuning weights (We = we*I, Wf = wf*I,
+        Wdf = wdf*I), applied by FFT convolution instead of N x N matrices (see learning_filters).
+        The returned filters are used in get_codes() in place of Q, L and G.
+        """
+        return learning_filters(len_X, im, we, wf, wdf)
+
+ 
     def get_codes(self, Xcs, Dq, itr, YQns, MLns,  Q, L, G):
 
         """ INPUTS:
@@ -187,9 +198,9 @@ class DSM_ILC:
             # DAC output
             match self.Qmodel:
                 case 1:
-                    u_dsm_out = self.generate_dac_output(NSQ_C, YQns.reshape(1,-1))
+                    u_dsm_out = generate_dac_output(NSQ_C, YQns.reshape(1,-1))
                 case 2:
-                    u_dsm_out = self.generate_dac_output(NSQ_C, MLns.reshape(1,-1))
+                    u_dsm_out = generate_dac_output(NSQ_C, MLns.reshape(1,-1))
 
             # Filter output
             y = G @ u_dsm_out.reshape(-1,1)
@@ -210,29 +221,6 @@ class DSM_ILC:
         return ILC_C
 
 
-    # Generate DAC output
-    def generate_dac_output(self,C, ML):
-        if C.shape[0] > ML.shape[0]:
-            print(C.shape[0])
-            print(ML.shape[0])
-            raise ValueError('Not enough channels in model.')
-
-        Y = np.zeros(C.shape)
-        
-        match 2:
-            case 1: # use loops
-                for k in range(0,C.shape[0]):
-                    for j in range(0,C.shape[1]):
-                        c = C[k,j]
-                        ml = ML[k,c]
-                        Y[k,j] = ml
-            case 2: # use numpy indexing
-                for k in range(0,C.shape[0]):
-                    Y[k,:] = ML[k,C[k,:]]
-            
-        return Y
-
-
     # def nsq(self, X, Dq, YQns, MLns,b,a):
     #     """
     #     X
@@ -12,6 +12,9 @@ Iterative learning control.
 import numpy as np
 from scipy import linalg, signal
 import sys
+import os
+import hashlib
+import tempfile
 import random
 import tqdm
 # from configurations import quantiser_configurations
@@ -161,7 +164,7 @@ def get_ILC_control(Xcs, u_init, itr, QF_M, L_M, OUT_M, Qstep, Q_levels, Qtype,
     return U, Y, E, rmsErr
 
 
-def learning_matrices(len_X, im):
+def learning_matrices(len_X, im, we=1, wf=1e-4, wdf=1e-1):
     """  Q-filter and Learning matrix generated using results from:
     D. A. Bristow, M. Tharayil and A. G. Alleyne, "A survey of iterative learning control," 
     in IEEE Control Systems, vol. 26, no. 3, pp. 96-114, June 2006
@@ -169,6 +172,7 @@ def learning_matrices(len_X, im):
     INPUT:
         len_X  - Length of reference signal. Q,L,G matrix dimension should match (len_X x len_X)
         im     - filter's impulse response
+        we, wf, wdf - tuning weights (We = we*I, Wf = wf*I, Wdf = wdf*I)
     
     OUTPUT:
         Q      - Q-filtering matrix
@@ -180,16 +184,16 @@ def learning_matrices(len_X, im):
     h = im[0]     # Impulse response 
 
     # Tuning matrices
-    We = np.identity(len_X)
-    Wf = np.identity(len_X)*1e-4
-    Wdf = np.identity(len_X)*1e-1
+    We = np.identity(len_X)*we
+    Wf = np.identity(len_X)*wf
+    Wdf = np.identity(len_X)*wdf
 
     RowVec = np.zeros((1, len_X))
     ColumnVec =  h[0:len_X]
     ColumnVec = np.reshape(ColumnVec, (len(ColumnVec),1))
 
     # Output Matrix
-    G = linalg.toeplitz(ColumnVec, RowVec)
+    G = linalg.toeplitz(ColumnVec.ravel(), RowVec.ravel())
 
     # Q-filter and Learning Matrices
     Subinverse11 =  G.transpose() @ We @ G 
@@ -219,6 +223,136 @@ def learning_matrices(len_X, im):
     return Q, L, G
 
 
+class ConvFilter:
+    """ Length-N filter applied by FFT convolution, as a drop-in replacement for
+    an N x N (Toeplitz) filter matrix, i.e. F @ x with x of shape (N,) or (N, 1).
+
+    The frequency response is sampled on nfft >= 2N-1 points, so that signals
+    are zero-padded and the convolution is acyclic: a causal impulse response
+    h gives exactly the lower triangular Toeplitz matrix product, and for a
+    non-causal (e.g. zero-phase) filter the response with support in (-N, N)
+    is applied without wrap-around.
+    """
+
+    def __init__(self, N, Hf, nfft):
+        self.N = N          # signal length
+        self.Hf = Hf        # frequency response (rfft bins)
+        self.nfft = nfft    # FFT length
+        self.shape = (N, N)
+
+    def __matmul__(self, x):
+        Xf = np.fft.rfft(x, self.nfft, axis=0)
+        Hf = self.Hf if x.ndim == 1 else self.Hf.reshape(-1, 1)
+        return np.fft.irfft(Hf*Xf, self.nfft, axis=0)[:self.N]
+
+
+def learning_filters(len_X, im, we=1, wf=1e-4, wdf=1e-1):
+    """  Q-filter and learning filter as in learning_matrices(), but for scalar (identity) tuning
+    matrices We = we*I, Wf = wf*I and Wdf = wdf*I, computed in the frequency domain:
+        Q(w) = (we*|G(w)|^2 + wdf)/(we*|G(w)|^2 + wf + wdf)
+        L(w) = we*conj(G(w))/(we*|G(w)|^2 + wdf)
+    i.e. the circulant approximation of the Q and L matrices. The filters are applied by
+    FFT convolution in O(N log N), without forming N x N matrices.
+    G is exact, but Q and L are only accurate in the interior of the signal: the finite-length
+    (Toeplitz) solution has boundary effects the stationary filters do not capture. E.g. for
+    N = 1400 and a 3rd order 100 kHz Butterworth filter (Fs = 1 MHz), L@x for a uniform random
+    x agrees to ~1e-15 in the interior but differs by up to 0.9 in the first and last samples
+    (|L@x| up to ~1.3), and the entries of Q differ by up to ~2e-4 near the edges, so the ILC
+    codes (and ENOB) differ from those with the dense matrices.
+
+    INPUT:
+        len_X  - Length of reference signal
+        im     - filter's impulse response
+        we, wf, wdf - tuning weights
+
+    OUTPUT:
+        Q      - Q-filter (ConvFilter)
+        L      - Learning filter (ConvFilter)
+        G      - Plant output filter (ConvFilter, exact lower triangular Toeplitz product)
+    """
+
+    h = np.ravel(im[0])[0:len_X]     # Impulse response
+    nfft = 2*len_X
+
+    Gf = np.fft.rfft(h, nfft)
+    G2 = we*np.abs(Gf)**2
+
+    Qf = (G2 + wdf)/(G2 + wf + wdf)
+    Lf = we*np.conj(Gf)/(G2 + wdf)
+
+    # Stability and monotonic convergence from the frequency response of the ILC loop Q - L*G
+    ILCloop = np.abs(Qf - Lf*Gf)
+    if np.max(ILCloop) <= 1:
+        print('Stablity Condition Satisfied')
+        print('ILC Monotonic Convergent Condition also Satisfied')
+    else:
+        sys.exit('Stability condition not satisfied. Change tuning matrices')
+
+    return ConvFilter(len_X, Qf, nfft), ConvFilter(len_X, Lf, nfft), ConvFilter(len_X, Gf, nfft)
+
+
+def learning_matrices_cached(len_X, im, we=1, wf=1e-4, wdf=1e-1, structured=False, cache_d='generated_ilc_matrices'):
+    """ Q-filter, learning and output matrices (or filters) stored on disk, keyed by a hash of the
+    impulse response, the tuning weights, the length and the form, such that repeated runs with the
+    same reconstruction filter skip the setup. The arrays are loaded memory-mapped.
+
+    Each dense entry takes 3*len_X**2*8 bytes (about 47 MB at len_X = 1400), a structured entry
+    about 40*len_X bytes (56 kB). The cache directory is never pruned; delete it to free the space.
+
+    INPUT:
+        len_X  - Length of reference signal
+        im     - filter's impulse response
+        we, wf, wdf - tuning weights (We = we*I, Wf = wf*I, Wdf = wdf*I)
+        structured - frequency-domain filters (learning_filters) or dense matrices (learning_matrices, default)
+        cache_d - cache directory
+
+    OUTPUT:
+        Q, L, G - as from learning_filters() or learning_matrices()
+    """
+
+    h = np.ravel(im[0])[0:len_X]     # Impulse response
+    key = hashlib.sha1()
+    key.update(np.ascontiguousarray(h, dtype=float).tobytes())
+    key.update(repr((len_X, float(we), float(wf), float(wdf), bool(structured))).encode('utf-8'))
+    cache_f = [os.path.join(cache_d, key.hexdigest() + '_' + n + '.npy') for n in ('Q', 'L', 'G')]
+
+    shape = (len_X + 1,) if structured else (len_X, len_X)  # rfft bins (nfft = 2*len_X) or matrix
+    if all(os.path.isfile(f) for f in cache_f):
+        try:
+            Q, L, G = (np.load(f, mmap_mode='r') for f in cache_f)
+            if any(M.shape != shape for M in (Q, L, G)):
+                raise ValueError('Unexpected shape.')
+        except (OSError, ValueError, EOFError) as err:  # truncated or corrupt file, rebuild
+            print(f'ILC matrix cache unreadable ({err}), rebuilding')
+        else:
+            if structured:
+                nfft = 2*len_X
+                Q, L, G = (ConvFilter(len_X, F, nfft) for F in (Q, L, G))
+            return Q, L, G
+
+    if structured:
+        Q, L, G = learning_filters(len_X, im, we, wf, wdf)
+        arrays = (Q.Hf, L.Hf, G.Hf)
+    else:
+        Q, L, G = learning_matrices(len_X, im, we, wf, wdf)
+        arrays = (Q, L, G)
+
+    # Write to a temporary file and rename, so that readers (e.g. other sweep workers)
+    # never see a partly written file
+    os.makedirs(cache_d, exist_ok=True)
+    for f, M in zip(cache_f, arrays):
+        fd, tmp_f = tempfile.mkstemp(dir=cache_d, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                np.save(fout, M)
+            os.replace(tmp_f, f)
+        except BaseException:
+            os.remove(tmp_f)
+            raise
+
+    return Q, L, G
+
+
 def get_periodMatrix(N, N_padding, ref_signal):
 
     N_period = int(N + 2*N_padding)       # Total samples in each period (signal length + padding length)
@@ -351,3 +485,35 @@ def generate_ML(Nb, Qstep, Q_levels):
     ml = Q_levels + inl
     ML_dict = dict(zip(level_codes, ml))
     return ML_dict
+
+
+def main():
+    """
+    Compare the dense learning matrices with the frequency-domain learning filters.
+    """
+    import time
+
+    Fs = 1e6
+    len_X = 1400
+    b1, a1 = signal.butter(3, 100e3/(Fs/2))
+    ft, fi = signal.dimpulse(signal.dlti(b1, a1, dt=1/Fs), n=2*len_X)
+
+    t0 = time.perf_counter()
+    Q, L, G = learning_matrices(len_X, fi)
+    dt_mat = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    Qf, Lf, Gf = learning_filters(len_X, fi)
+    dt_flt = time.perf_counter() - t0
+
+    x = np.random.randn(len_X, 1)
+    e = np.random.randn(len_X, 1)
+    u_mat = Q @ (x + L @ e)
+    u_flt = Qf @ (x + Lf @ e)
+    n = slice(len_X//4, 3*len_X//4)  # away from the edges (circulant approximation)
+    print(f'matrices: {dt_mat:.2f} s, filters: {dt_flt*1e3:.2f} ms')
+    print(f'G: max abs. difference {np.max(np.abs(G @ x - Gf @ x)):.2e}')
+    print(f'ILC update: rel. difference (mid-segment) {np.linalg.norm(u_mat[n] - u_flt[n])/np.linalg.norm(u_mat[n]):.2e}')
+
+
+if __name__ == "__main__":
+    main()
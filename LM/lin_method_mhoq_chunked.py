@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Parallel, chunked execution of the MHOQ/MPC code generation.
+
+The reference is split into segments that are optimised independently in a
+process pool. Each segment is preceded by a warm-up overlap (taken from the
+previous segment) which lets the reconstruction filter state in the receding
+horizon optimisation converge; the codes generated during the overlap are
+discarded and the remaining codes are stitched together.
+
+Works with any of the MHOQ classes (MPC, MPC_BIN, MHOQ_RLIM, MHOQ_RLIM_RM),
+passing any extra arguments on to their get_codes().
+
+@date: 16.10.2026
+@license: BSD 3-Clause
+"""
+
+import numpy as np
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def warmup_length(A, tol=1e-6):
+    """
+    Number of samples for the free response of the filter x[k+1] = A x[k]
+    to decay below a relative tolerance (based on the spectral radius of A).
+    """
+    rho = np.max(np.abs(np.linalg.eigvals(np.atleast_2d(A))))
+    if rho >= 1:
+        raise ValueError('Filter is not asymptotically stable, specify the overlap.')
+    return max(int(math.ceil(math.log(tol)/math.log(rho))), 1)
+
+
+def _get_codes_segment(MHOQ_OBJ, N_PRED, X, YQns, MLns, args, kwargs):
+    return MHOQ_OBJ.get_codes(N_PRED, X, YQns, MLns, *args, **kwargs)
+
+
+def get_codes_chunked(MHOQ_OBJ, N_PRED, Xcs, YQns, MLns, *args, overlap=None, workers=None, n_chunks=None, **kwargs):
+    """
+    Generate codes with MHOQ_OBJ.get_codes() on overlapping segments of the reference in parallel.
+
+    Arguments
+        MHOQ_OBJ - an MHOQ/MPC object (e.g. MPC, MHOQ_RLIM)
+        N_PRED - prediction horizon
+        Xcs - reference signal
+        YQns, MLns - ideal and measured levels
+        *args - further positional arguments for get_codes() (e.g. Step)
+        overlap - warm-up length in samples (default from the filter decay time)
+        workers - number of worker processes (default os.cpu_count())
+        n_chunks - number of segments (default equal to workers)
+        **kwargs - further keyword arguments for get_codes() (e.g. solver)
+
+    Returns
+        C - codes, same shape as from MHOQ_OBJ.get_codes(N_PRED, Xcs, ...)
+    """
+    if workers is None:
+        workers = os.cpu_count()
+    if n_chunks is None:
+        n_chunks = workers
+    if overlap is None:
+        overlap = warmup_length(MHOQ_OBJ.A)
+
+    Xcs = Xcs.squeeze()
+    len_C = Xcs.size - N_PRED  # number of codes from a sequential run
+    edges = np.linspace(0, len_C, n_chunks + 1).astype(int)
+
+    # Segment k produces codes for [edges[k], edges[k+1]), preceded by the overlap
+    starts = [max(s - overlap, 0) for s in edges[:-1]]
+    segments = [Xcs[s0:e + N_PRED] for s0, e in zip(starts, edges[1:])]
+
+    if workers == 1:
+        C_seg = [_get_codes_segment(MHOQ_OBJ, N_PRED, X, YQns, MLns, args, kwargs) for X in segments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_get_codes_segment, MHOQ_OBJ, N_PRED, X, YQns, MLns, args, kwargs) for X in segments]
+            C_seg = [f.result() for f in futures]
+
+    # Discard the codes generated during the overlaps and stitch
+    C = np.concatenate([c[:, s - s0:] for c, s, s0 in zip(C_seg, edges[:-1], starts)], axis=1)
+
+    return C
+
+
+def main():
+    """
+    Quality check: compare ENOB of the chunked and the sequential run.
+    """
+    import time
+    from utils.mpc_filter_parameters import mpc_filter_parameters
+    from utils.static_dac_model import generate_dac_output
+    from utils.figures_of_merit import eval_enob_sinad, SINAD_COMP
+    from scipy import signal
+    from LM.lin_method_mpc import MPC
+    from LM.lin_method_util import MHOQ_SOLVER
+
+    Nb = 8
+    Vmin, Vmax = -1, 1
+    Qstep = (Vmax - Vmin)/(2**Nb - 1)
+    YQns = np.linspace(Vmin, Vmax, 2**Nb)
+    MLns = YQns + Qstep*np.random.uniform(-0.5, 0.5, YQns.size)  # emulated INL
+
+    Fs = 1e6
+    Fx = 5e3
+    N_PRED = 2
+    t = np.arange(0, 7/Fx, 1/Fs)
+    X = 0.9*Vmax*np.cos(2*np.pi*Fx*t)
+
+    A, B, C, D = mpc_filter_parameters(1)
+    MPC_OBJ = MPC(Nb, Qstep, 2, A, B, C, D)
+
+    t0 = time.perf_counter()
+    C_seq = MPC_OBJ.get_codes(N_PRED, X, YQns, MLns, solver=MHOQ_SOLVER.GUROBI)
+    dt_seq = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    C_par = get_codes_chunked(MPC_OBJ, N_PRED, X, YQns, MLns, workers=4, solver=MHOQ_SOLVER.GUROBI)
+    dt_par = time.perf_counter() - t0
+
+    b, a = signal.butter(3, 100e3, fs=Fs)
+    TRANSOFF = int(1.2*Fs/Fx)
+    for name, codes, dt in [('sequential', C_seq, dt_seq), ('chunked', C_par, dt_par)]:
+        y = signal.lfilter(b, a, generate_dac_output(codes, MLns.reshape(1, -1))[0])
+        ENOB, SINAD = eval_enob_sinad(t[:y.size], y, Fs, TRANSOFF, SINAD_COMP.CFIT, print_results=False)
+        print(f'{name}: ENOB {ENOB:.3f}, {dt:.2f} s')
+    print(f'codes differing: {np.count_nonzero(C_seq != C_par)} of {C_seq.size}')
+
+
+if __name__ == "__main__":
+    main()
@@ -17,9 +17,12 @@ import numpy as np  # Used for numerical computations
 from scipy import linalg, signal  # SciPy modules for linear algebra and signal processing
 import sys
 import random  # Standard Python module for random number generation
+import time  # Used for timing the solver in main()
 import gurobipy as gp  # Import Gurobi for solving the optimization problem
 from gurobipy import GRB  # Import Gurobi constants
 import tqdm  # For displaying a progress bar
+from LM.lin_method_util import MHOQ_SOLVER, use_horizon1, mhoq_horizon1  # Solver selection and horizon-1 solver
+from utils.sphere_decoder import prediction_matrices, sphere_decode  # Tree-search solver
 
 
 class MPC:
@@ -71,11 +74,245 @@ class MPC:
         return Xs
 
     
-    def get_codes(self, N_PRED, Xcs, YQns, MLns):
+    def get_codes(self, N_PRED, Xcs, YQns, MLns, reuse_model=True, solver=MHOQ_SOLVER.AUTO):
         """
         Computes the optimal DAC codes using Model Predictive Control (MPC).
         The optimization ensures that the DAC output follows the desired signal as closely as possible.
 
+        A single Gurobi environment and model is built for the whole run; per step only the
+        initial-state constraint and the reference are updated, and the shifted previous
+        solution is passed as a MIP start.
+
+        :param N_PRED: Prediction horizon (number of future steps considered in MPC)
+        :param Xcs: Reference input signal to be quantized
+        :param YQns: Ideal quantization levels
+        :param MLns: Measured quantization levels
+        :param reuse_model: Reuse one model for all samples (False rebuilds it for every sample)
+        :param solver: Optimisation solver (AUTO enumerates the codes when N_PRED = 1, see MHOQ_SOLVER)
+        :return: Optimal DAC code sequence
+        """
+        if use_horizon1(solver, N_PRED):
+            return self.get_codes_horizon1(Xcs, YQns, MLns)
+        if solver is MHOQ_SOLVER.SPHERE:
+            return self.get_codes_sphere(N_PRED, Xcs, YQns, MLns)
+
+        if not reuse_model:
+            return self.get_codes_rebuild(N_PRED, Xcs, YQns, MLns)
+
+        # Scale the reference signal for the quantizer
+        X = self.q_scaling(Xcs)  # Normalize the input signal
+
+        # Choose quantization levels based on the selected model (Ideal vs Measured)
+        match self.QMODEL:
+            case 1:
+                QLS = self.q_scaling(YQns.reshape(1, -1)).squeeze()  # Ideal quantization levels
+            case 2:
+                QLS = self.q_scaling(MLns.reshape(1, -1)).squeeze()  # Measured quantization levels
+
+        # Storage container for DAC codes
+        C = []
+
+        # Define loop length for MPC optimization
+        len_MPC = X.size - N_PRED  # Number of iterations to perform
+
+        # Determine the dimension of the state vector
+        x_dim = int(self.A.shape[0])  # The number of state variables
+
+        # Initialize state to zero (assumes no prior knowledge of initial conditions)
+        init_state = np.zeros(x_dim).reshape(-1, 1)
+
+        # Initialize the Gurobi optimization environment (once per run)
+        env = gp.Env(empty=True)
+        env.setParam("OutputFlag", 0)  # Disable solver logs
+        env.start()
+        m = gp.Model("MPC- INL", env=env)  # Create a Gurobi model instance
+
+        # Define decision variables for optimization
+        u = m.addMVar(N_PRED, vtype=GRB.INTEGER, name="u", lb=0, ub=2**self.Nb - 1)  # Discrete control input
+        x = m.addMVar((x_dim * (N_PRED + 1), 1), vtype=GRB.CONTINUOUS,
+                      lb=-GRB.INFINITY, ub=GRB.INFINITY, name="x")  # State trajectory
+
+        # Reference over the horizon, held fixed through its bounds and updated every step
+        r = m.addMVar(N_PRED, vtype=GRB.CONTINUOUS, lb=X[0:N_PRED], ub=X[0:N_PRED], name="r")
+
+        # Initialize the objective function (error minimization)
+        Obj = 0
+
+        # Apply initial condition constraint (right-hand side updated every step)
+        init_constr = m.addConstr(x[0:x_dim, :] == init_state)
+
+        # Loop through the prediction horizon to set up constraints and objective function
+        for i in range(N_PRED):
+            k = x_dim * i  # Compute index for state vector
+            st = x[k:k + x_dim]  # Extract current state
+            con = u[i] - r[i]  # Compute control deviation from reference signal
+
+            # Compute the error between desired and actual output
+            e_t = self.C @ x[k:k + x_dim] + self.D * con
+            Obj += e_t * e_t  # Accumulate squared error in the objective function
+
+            # Update system dynamics constraints
+            f_value = self.A @ st + self.B * con  # Compute next state
+            st_next = x[k + x_dim:k + 2 * x_dim]  # Extract next state variable
+            m.addConstr(st_next == f_value)  # Enforce state transition constraint
+
+        # Set the optimization objective (minimize tracking error)
+        m.setObjective(Obj, GRB.MINIMIZE)
+
+        # Configure solver parameters for high precision
+        m.Params.IntFeasTol = 1e-9  # Set integer feasibility tolerance
+        m.Params.IntegralityFocus = 1  # Prioritize finding integer solutions
+
+        # Start MPC loop to optimize DAC codes
+        for j in tqdm.tqdm(range(len_MPC)):  # Iterate over all input samples
+
+            # Update the initial state and the reference
+            init_constr.RHS = init_state
+            r.LB = X[j:j + N_PRED]
+            r.UB = X[j:j + N_PRED]
+
+            # Warm start from the previous solution, shifted one step
+            if j > 0:
+                u.Start = np.append(C_MPC[1:], C_MPC[-1])
+
+            # Solve the optimization problem
+            m.optimize()
+
+            # Extract the optimal DAC code sequence
+            C_MPC = np.rint(u.X).astype(int)  # Convert to integer
+
+            # Store only the first code from the prediction sequence
+            C.append(C_MPC[0])
+
+            # Get the DAC level based on the selected model (ideal or measured)
+            U_opt = QLS[C_MPC[0]]
+
+            # Predict next state based on optimal control input
+            con = U_opt - X[j]
+            init_state = self.state_prediction(init_state, con)
+
+        m.dispose()
+        env.dispose()
+
+        # Return the final computed DAC code sequence as a 2D array
+        return np.array(C).reshape(1, -1)
+
+
+    def get_codes_horizon1(self, Xcs, YQns, MLns):
+        """
+        Computes the optimal DAC codes for prediction horizon 1 without a solver.
+        The cost is a scalar quadratic in the code, so the optimum is the admissible
+        code closest to the unconstrained minimiser.
+
+        :param Xcs: Reference input signal to be quantized
+        :param YQns: Ideal quantization levels
+        :param MLns: Measured quantization levels
+        :return: Optimal DAC code sequence
+        """
+
+        # Scale the reference signal for the quantizer
+        X = self.q_scaling(Xcs)  # Normalize the input signal
+
+        # Choose quantization levels based on the selected model (Ideal vs Measured)
+        match self.QMODEL:
+            case 1:
+                QLS = self.q_scaling(YQns.reshape(1, -1)).squeeze()  # Ideal quantization levels
+            case 2:
+                QLS = self.q_scaling(MLns.reshape(1, -1)).squeeze()  # Measured quantization levels
+
+        # The objective uses the code itself as the control input
+        codes = np.arange(2**self.Nb)
+        d = float(np.squeeze(self.D))
+
+        # Storage container for DAC codes
+        C = []
+
+        # Define loop length (same as for the prediction horizon N_PRED = 1)
+        len_MPC = X.size - 1
+
+        # Initialize state to zero (assumes no prior knowledge of initial conditions)
+        init_state = np.zeros(int(self.A.shape[0])).reshape(-1, 1)
+
+        for j in tqdm.tqdm(range(len_MPC)):  # Iterate over all input samples
+
+            # Optimal code for the current state
+            a = float(np.squeeze(self.C @ init_state))
+            c = mhoq_horizon1(codes, a, d, X[j], sorted_levels=True)
+            C.append(c)
+
+            # Predict next state based on optimal control input
+            con = QLS[c] - X[j]
+            init_state = self.state_prediction(init_state, con)
+
+        # Return the final computed DAC code sequence as a 2D array
+        return np.array(C).reshape(1, -1)
+
+
+    def get_codes_sphere(self, N_PRED, Xcs, YQns, MLns):
+        """
+        Computes the optimal DAC codes by sphere decoding (no MIP solver needed).
+        The shifted previous solution is used as the incumbent for pruning.
+
+        :param N_PRED: Prediction horizon (number of future steps considered in MPC)
+        :param Xcs: Reference input signal to be quantized
+        :param YQns: Ideal quantization levels
+        :param MLns: Measured quantization levels
+        :return: Optimal DAC code sequence
+        """
+
+        # Scale the reference signal for the quantizer
+        X = self.q_scaling(Xcs)  # Normalize the input signal
+
+        # Choose quantization levels based on the selected model (Ideal vs Measured)
+        match self.QMODEL:
+            case 1:
+                QLS = self.q_scaling(YQns.reshape(1, -1)).squeeze()  # Ideal quantization levels
+            case 2:
+                QLS = self.q_scaling(MLns.reshape(1, -1)).squeeze()  # Measured quantization levels
+
+        # The objective uses the code itself as the control input
+        codes = np.arange(2**self.Nb)
+        lb = np.zeros(N_PRED, dtype=int)
+        ub = np.full(N_PRED, 2**self.Nb)
+
+        # Output prediction matrices over the horizon
+        H, G = prediction_matrices(self.A, self.B, self.C, self.D, N_PRED)
+
+        # Storage container for DAC codes
+        C = []
+
+        # Define loop length for MPC optimization
+        len_MPC = X.size - N_PRED  # Number of iterations to perform
+
+        # Initialize state to zero (assumes no prior knowledge of initial conditions)
+        init_state = np.zeros(int(self.A.shape[0])).reshape(-1, 1)
+        C_MPC = None
+
+        for j in tqdm.tqdm(range(len_MPC)):  # Iterate over all input samples
+
+            # Target for the predicted outputs
+            y = H @ X[j:j + N_PRED] - (G @ init_state).ravel()
+
+            # Shifted previous solution as incumbent
+            C_start = None if C_MPC is None else np.append(C_MPC[1:], C_MPC[-1])
+            C_MPC, _ = sphere_decode(H, y, codes, lb, ub, C_start)
+
+            # Store only the first code from the prediction sequence
+            C.append(C_MPC[0])
+
+            # Predict next state based on optimal control input
+            con = QLS[C_MPC[0]] - X[j]
+            init_state = self.state_prediction(init_state, con)
+
+        # Return the final computed DAC code sequence as a 2D array
+        return np.array(C).reshape(1, -1)
+
+
+    def get_codes_rebuild(self, N_PRED, Xcs, YQns, MLns):
+        """
+        Computes the optimal DAC codes using Model Predictive Control (MPC), building a new
+        Gurobi environment and model for every sample (reference implementation).
+
         :param N_PRED: Prediction horizon (number of future steps considered in MPC)
         :param Xcs: Reference input signal to be quantized
         :param YQns: Ideal quantization levels
@@ -176,3 +413,45 @@ class MPC:
 
         # Return the final computed DAC code sequence as a 2D array
         return np.array(C).reshape(1, -1)
+
+
+
+def main():
+    """
+    Compare per-sample solve latency of the rebuilt and the reused model.
+    """
+    from utils.mpc_filter_parameters import mpc_filter_parameters
+
+    Nb = 6
+    Vmin, Vmax = -1, 1
+    Qstep = (Vmax - Vmin)/(2**Nb - 1)
+    YQns = np.linspace(Vmin, Vmax, 2**Nb)
+    MLns = YQns + Qstep*np.random.uniform(-0.2, 0.2, YQns.size)  # emulated INL
+
+    Fs = 1e6
+    t = np.arange(0, 1/5e3, 1/Fs)
+    X = 0.9*Vmax*np.cos(2*np.pi*5e3*t)
+
+    A, B, C, D = mpc_filter_parameters(1)
+    MPC_OBJ = MPC(Nb, Qstep, 2, A, B, C, D)
+
+    for N_PRED in [1, 2]:
+        t0 = time.perf_counter()
+        C_rebuild = MPC_OBJ.get_codes(N_PRED, X, YQns, MLns, reuse_model=False, solver=MHOQ_SOLVER.GUROBI)
+        dt_rebuild = (time.perf_counter() - t0)/C_rebuild.size
+        t0 = time.perf_counter()
+        C_reuse = MPC_OBJ.get_codes(N_PRED, X, YQns, MLns, reuse_model=True, solver=MHOQ_SOLVER.GUROBI)
+        dt_reuse = (time.perf_counter() - t0)/C_reuse.size
+        print(f'N_PRED={N_PRED}: rebuild {dt_rebuild*1e3:.3f} ms/sample, reuse {dt_reuse*1e3:.3f} ms/sample, '
+              f'identical codes: {np.array_equal(C_rebuild, C_reuse)}')
+
+    # Solver-free path for prediction horizon 1
+    t0 = time.perf_counter()
+    C_enum = MPC_OBJ.get_codes(1, X, YQns, MLns, solver=MHOQ_SOLVER.ENUM)
+    dt_enum = (time.perf_counter() - t0)/C_enum.size
+    C_grb = MPC_OBJ.get_codes(1, X, YQns, MLns, solver=MHOQ_SOLVER.GUROBI)
+    print(f'N_PRED=1: enumeration {dt_enum*1e3:.4f} ms/sample, identical codes: {np.array_equal(C_enum, C_grb)}')
+
+
+if __name__ == "__main__":
+    main()
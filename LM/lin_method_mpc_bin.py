@@ -20,6 +20,7 @@ import random  # Standard Python module for random number generation
 import gurobipy as gp  # Import Gurobi for solving the optimization problem
 from gurobipy import GRB  # Import Gurobi constants
 import tqdm  # For displaying a progress bar
+from LM.lin_method_util import MHOQ_SOLVER, use_horizon1, mhoq_horizon1  # Solver selection and horizon-1 solver
 
 
 class MPC_BIN:
@@ -67,7 +68,7 @@ class MPC_BIN:
         Xs = X.squeeze() / self.Qstep + 2**(self.Nb - 1)  # Normalization based on bit depth
         return Xs
     
-    def get_codes(self, N_PRED, X, YQns, MLns ):
+    def get_codes(self, N_PRED, X, YQns, MLns, solver=MHOQ_SOLVER.AUTO, window=None):
         """
         Computes the optimal control inputs to minimize DAC non-linearity errors 
         using Model Predictive Control (MPC).
@@ -76,8 +77,14 @@ class MPC_BIN:
         :param X: Reference signal (desired DAC output).
         :param YQns: Ideal quantization levels.
         :param MLns: Measured quantization levels.
+        :param solver: Optimisation solver (AUTO enumerates the codes when N_PRED = 1, see MHOQ_SOLVER).
+        :param window: Half-width (in codes) of the restricted search window, None - all 2**Nb codes (see get_codes_window).
         :return: Optimized control (codes corresponding to quantiser levels)
         """
+        if use_horizon1(solver, N_PRED):
+            return self.get_codes_horizon1(X, YQns, MLns)
+        if window is not None:
+            return self.get_codes_window(N_PRED, X, YQns, MLns, window)
 
         # Scale input signals for numerical stability
         Xcs = self.q_scaling(X)  # Scale reference signal
@@ -187,3 +194,208 @@ class MPC_BIN:
             init_state = x0_new
 
         return np.array(C).reshape(1,-1)
+
+
+    def get_codes_horizon1(self, X, YQns, MLns):
+        """
+        Computes the optimal control inputs for prediction horizon 1 without a solver,
+        by picking the level minimising the (scalar quadratic) cost.
+
+        :param X: Reference signal (desired DAC output).
+        :param YQns: Ideal quantization levels.
+        :param MLns: Measured quantization levels.
+        :return: Optimized control (codes corresponding to quantiser levels)
+        """
+
+        # Scale input signals for numerical stability
+        Xcs = self.q_scaling(X)  # Scale reference signal
+        QL_I = self.q_scaling(YQns)  # Scale ideal quantization levels
+        QL_M = self.q_scaling(MLns)  # Scale measured quantization levels
+        QL_I_sorted = bool(np.all(np.diff(QL_I) > 0))
+        d = float(np.squeeze(self.D))
+
+        # Storage for computed codes
+        C = []
+
+        # MPC loop length (same as for the prediction horizon N_PRED = 1)
+        len_MPC = Xcs.size - 1
+
+        # Initialize system state to zero
+        init_state = np.zeros(int(self.A.shape[0])).reshape(-1,1)
+
+        for j in tqdm.tqdm(range(len_MPC)):  # Iterate through signal samples
+
+            # Optimal code for the current state
+            a = float(np.squeeze(self.C @ init_state))
+            c = mhoq_horizon1(QL_I, a, d, Xcs[j], sorted_levels=QL_I_sorted)
+            C.append(c)
+
+             # Determine output based on DAC model selection
+            match self.QMODEL:
+                case 1:
+                    U_opt = QL_I[c]  # Ideal DAC output
+                case 2:
+                    U_opt = QL_M[c]  # Measured DAC output
+
+            # Predict next state using chosen optimal control input 
+            con = U_opt - Xcs[j]
+            init_state = self.state_prediction(init_state, con)
+
+        return np.array(C).reshape(1,-1)
+
+
+    def get_codes_window(self, N_PRED, X, YQns, MLns, window):
+        """
+        Computes the optimal control inputs with the binary variables restricted to a
+        window of codes around the direct-quantised reference at each prediction step,
+        i.e. (2*window + 1) x N_PRED binaries per sample instead of 2**Nb x N_PRED.
+        If the optimal code lies on the boundary of its window, the window is doubled
+        and the sample is solved again.
+
+        :param N_PRED: Prediction horizon (number of future steps considered).
+        :param X: Reference signal (desired DAC output).
+        :param YQns: Ideal quantization levels.
+        :param MLns: Measured quantization levels.
+        :param window: Half-width (in codes) of the initial search window, at least 1.
+        :return: Optimized control (codes corresponding to quantiser levels)
+        """
+        if int(window) < 1:
+            raise ValueError('The search window must be at least 1 code.')
+
+        # Scale input signals for numerical stability
+        Xcs = self.q_scaling(X)  # Scale reference signal
+        QL_I = self.q_scaling(YQns)  # Scale ideal quantization levels
+        QL_M = self.q_scaling(MLns)  # Scale measured quantization levels
+        N_codes = QL_I.size
+
+        # Direct-quantised reference (window centres)
+        C_DQ = np.clip(np.floor(Xcs + 0.5), 0, N_codes - 1).astype(int)
+
+        # Storage for computed codes
+        C = []
+
+        # MPC loop length (usually signal length - prediction horizon)
+        len_MPC = Xcs.size - N_PRED
+
+        # Dimension of the state vector, determined by system order
+        x_dim =  int(self.A.shape[0]) 
+
+        # Initialize system state to zero
+        init_state = np.zeros(x_dim).reshape(-1,1)
+
+        # Gurobi optimization environment (shared by all samples)
+        env = gp.Env(empty=True)
+        env.setParam("OutputFlag",0) # Suppress solver logs
+        env.start()
+
+        for j in tqdm.tqdm(range(len_MPC)):  # Iterate through signal samples
+
+            W = int(window)
+            while True:
+                # Code window for each step in the prediction horizon
+                lb = np.maximum(C_DQ[j:j+N_PRED] - W, 0)
+                ub = np.minimum(C_DQ[j:j+N_PRED] + W, N_codes - 1) + 1
+
+                m = gp.Model("MPC- INL", env = env)  # Create optimization model
+
+                # Binary control variables for the window of each step, and state variables
+                u = [m.addMVar(ub[i] - lb[i], vtype=GRB.BINARY, name= f"u{i}") for i in range(N_PRED)]
+                x = m.addMVar((x_dim*(N_PRED+1),1), vtype= GRB.CONTINUOUS, lb = -GRB.INFINITY, ub = GRB.INFINITY, name = "x")  #State variables
+
+                # Initialize the objective function (minimization of error)
+                Obj = 0 # Initialize
+
+                # Set the initial state constraint
+                m.addConstr(x[0:x_dim,:] == init_state, "Initial state")
+                for i in range(N_PRED):
+                    k = x_dim * i
+                    st = x[k:k+x_dim]    # Current state
+
+                    # Compute control input using binary selection
+                    bin_con = QL_I[lb[i]:ub[i]].reshape(1,-1) @ u[i].reshape(-1,1)
+                    con = bin_con - Xcs[j+i] # Control error relative to reference
+
+                    # Objective function update (minimize squared error)
+                    e_t = self.C @ x[k:k+x_dim] + self.D * con
+                    Obj = Obj + e_t * e_t # Objective function udpate
+
+                    # State update constraint (system dynamics)
+                    f_value = self.A @ st + self.B * con
+                    st_next = x[k+x_dim:k+2*x_dim]
+                    m.addConstr(st_next == f_value, "State constrait")
+
+                    # Binary constraint (ensure exactly one control value is selected)
+                    m.addConstr(gp.quicksum(u[i]) == 1)
+
+                # Set optimization objective (minimize error)
+                m.setObjective(Obj, GRB.MINIMIZE)
+
+                # Solver precision settings
+                m.Params.IntFeasTol = 1e-9 # Integer feasibility tolerance
+                m.Params.IntegralityFocus = 1 # Focus on finding integer solutions
+
+                # Solve the optimization problem
+                m.optimize()
+
+                # Decode the optimal control sequence
+                C_MPC = np.array([lb[i] + int(np.argmax(u[i].X)) for i in range(N_PRED)])
+                m.dispose()
+
+                # Widen the window if the optimum is on a (non-saturated) boundary
+                on_boundary = ((C_MPC == lb) & (lb > 0)) | ((C_MPC == ub - 1) & (ub < N_codes))
+                if not np.any(on_boundary) or W >= N_codes:
+                    break
+                W = max(2*W, 1)
+
+            C.append(C_MPC[0])
+
+             # Determine output based on DAC model selection
+            match self.QMODEL:
+                case 1:
+                    U_opt = QL_I[C_MPC[0]]  # Ideal DAC output
+                case 2:
+                    U_opt = QL_M[C_MPC[0]]  # Measured DAC output
+
+            # Predict next state using chosen optimal control input 
+            con = U_opt - Xcs[j]
+            init_state = self.state_prediction(init_state, con)
+
+        env.dispose()
+
+        return np.array(C).reshape(1,-1)
+
+
+def main():
+    """
+    Compare the full and the window-restricted binary formulations.
+    """
+    import time
+    from utils.mpc_filter_parameters import mpc_filter_parameters
+
+    Nb = 6
+    Vmin, Vmax = -1, 1
+    Qstep = (Vmax - Vmin)/(2**Nb - 1)
+    YQns = np.linspace(Vmin, Vmax, 2**Nb)
+    MLns = YQns + Qstep*np.random.uniform(-0.5, 0.5, YQns.size)  # emulated INL
+
+    Fs = 1e6
+    t = np.arange(0, 0.5/5e3, 1/Fs)
+    X = 0.9*Vmax*np.cos(2*np.pi*5e3*t)
+
+    A, B, C, D = mpc_filter_parameters(1)
+    MPC_OBJ = MPC_BIN(Nb, Qstep, 2, A, B, C, D)
+
+    N_PRED = 2
+    t0 = time.perf_counter()
+    C_full = MPC_OBJ.get_codes(N_PRED, X, YQns, MLns)
+    dt_full = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    C_win = MPC_OBJ.get_codes(N_PRED, X, YQns, MLns, window=2)
+    dt_win = time.perf_counter() - t0
+
+    print(f'full: {dt_full/C_full.size*1e3:.2f} ms/sample, window: {dt_win/C_win.size*1e3:.2f} ms/sample, '
+          f'identical codes: {np.array_equal(C_full, C_win)}')
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,8 @@ import random
 import gurobipy as gp
 from gurobipy import GRB
 import tqdm
+from LM.lin_method_util import MHOQ_SOLVER, use_horizon1, mhoq_horizon1
+from utils.sphere_decoder import prediction_matrices, sphere_decode
 
 
 
@@ -62,7 +64,7 @@ class MHOQ_RLIM:
         return X.squeeze() / self.Qstep + 2**(self.Nb - 1)
 
 
-    def get_codes(self, N_PRED, Xcs, YQns, MLns, Step):
+    def get_codes(self, N_PRED, Xcs, YQns, MLns, Step, solver=MHOQ_SOLVER.AUTO):
 
         """Computes optimal DAC codes using Mixed-Integer Optimization while minimizing switching frequency.
         
@@ -71,8 +73,14 @@ class MHOQ_RLIM:
         :param YQns: Ideal quantization levels
         :param MLns: Measured quantization levels
         :param Step: Maximum allowable change (step) between consecutive quantization levels
+        :param solver: Optimisation solver (AUTO enumerates the codes when N_PRED = 1, see MHOQ_SOLVER)
         :return: Optimal DAC code sequence
         """
+        if use_horizon1(solver, N_PRED):
+            return self.get_codes_horizon1(Xcs, YQns, MLns, Step)
+        if solver is MHOQ_SOLVER.SPHERE:
+            return self.get_codes_sphere(N_PRED, Xcs, YQns, MLns, Step)
+
         # # Scale input signals for numerical stability
         Xcs = self.q_scaling(Xcs)  # Scale reference signal
         QL_I = self.q_scaling(YQns)  # Scale reference signal
@@ -163,4 +171,115 @@ class MHOQ_RLIM:
             init_state = self.state_prediction(init_state, con)  # Update state
             u_kminus1_ind = C_MPC
 
-        return np.array(C_Store).reshape(1, -1)  # Return optimized DAC codes
\ No newline at end of file
+        return np.array(C_Store).reshape(1, -1)  # Return optimized DAC codes
+
+
+    def get_codes_sphere(self, N_PRED, Xcs, YQns, MLns, Step):
+        """Computes optimal DAC codes by sphere decoding over the step-limited code windows
+        (no MIP solver needed). The shifted previous solution is used as the incumbent.
+
+        :param N_PRED: Prediction horizon (number of future steps considered in optimization)
+        :param Xcs: Reference input signal to be quantized
+        :param YQns: Ideal quantization levels
+        :param MLns: Measured quantization levels
+        :param Step: Maximum allowable change (step) between consecutive quantization levels
+        :return: Optimal DAC code sequence
+        """
+        Xcs = self.q_scaling(Xcs)  # Scale reference signal
+        QL_I = self.q_scaling(YQns)  # Scale reference signal
+        QL_M = self.q_scaling(MLns)  # Scale reference signal
+
+        # Output prediction matrices over the horizon
+        H, G = prediction_matrices(self.A, self.B, self.C, self.D, N_PRED)
+
+        C_Store = []  # Storage container for DAC codes
+        len_MPC = Xcs.size - N_PRED  # Number of optimization iterations
+        e_step = []
+        init_state = np.zeros((self.A.shape[0], 1))  # Initialize state vector to zero
+        C_MPC = None
+
+        # Initialize previous control input based on first sample quantization
+        u_kminus1_ind = int(np.floor(Xcs[0]  + 0.5))
+        u_kminus1_ind = np.ones(N_PRED) * u_kminus1_ind  # Extend to prediction horizon
+
+        for j in tqdm.tqdm(range(len_MPC)):
+            # Search bounds for control input (same windows as the MIP formulation)
+            lb = np.zeros(N_PRED, dtype=int)
+            ub = np.zeros(N_PRED, dtype=int)
+            for i in range(N_PRED):
+                e_step.append(abs(u_kminus1_ind[i] - Xcs[j + i]))
+                ub[i] = min(int(u_kminus1_ind[i] + Step + e_step[j]), 2**self.Nb - 1) + 1
+                lb[i] = max(int(u_kminus1_ind[i] - Step - e_step[j]), 0)
+
+            # Target for the predicted outputs
+            y = H @ Xcs[j:j + N_PRED] - (G @ init_state).ravel()
+
+            # Shifted previous solution as incumbent
+            C_start = None if C_MPC is None else np.append(C_MPC[1:], C_MPC[-1])
+            C_MPC, _ = sphere_decode(H, y, QL_I, lb, ub, C_start)
+            C_Store.append(C_MPC[0])
+
+            # Select DAC output based on the quantization model
+            match self.QMODEL:
+                case 1:
+                    U_opt = QL_I[C_MPC[0]] 
+                case 2:
+                    U_opt = QL_M[C_MPC[0]] 
+
+            # Predict next state based on optimal control input
+            con = U_opt - Xcs[j]
+            init_state = self.state_prediction(init_state, con)  # Update state
+            u_kminus1_ind = C_MPC
+
+        return np.array(C_Store).reshape(1, -1)  # Return optimized DAC codes
+
+
+    def get_codes_horizon1(self, Xcs, YQns, MLns, Step):
+        """Computes optimal DAC codes for prediction horizon 1 without a solver,
+        by evaluating the (scalar quadratic) cost over the step-limited code window.
+
+        :param Xcs: Reference input signal to be quantized
+        :param YQns: Ideal quantization levels
+        :param MLns: Measured quantization levels
+        :param Step: Maximum allowable change (step) between consecutive quantization levels
+        :return: Optimal DAC code sequence
+        """
+        Xcs = self.q_scaling(Xcs)  # Scale reference signal
+        QL_I = self.q_scaling(YQns)  # Scale reference signal
+        QL_M = self.q_scaling(MLns)  # Scale reference signal
+        QL_I_sorted = bool(np.all(np.diff(QL_I) > 0))
+        d = float(np.squeeze(self.D))
+
+        C_Store = []  # Storage container for DAC codes
+        len_MPC = Xcs.size - 1  # Number of optimization iterations
+        init_state = np.zeros((self.A.shape[0], 1))  # Initialize state vector to zero
+
+        # Initialize previous control input based on first sample quantization
+        u_kminus1_ind = int(np.floor(Xcs[0]  + 0.5))
+
+        for j in tqdm.tqdm(range(len_MPC)):
+            # Add e_step to alow headroom when finding a solution between larger xref steps
+            e_step = abs(u_kminus1_ind - Xcs[j])
+
+            # Define search bounds for control input
+            ub = min(int(u_kminus1_ind + Step + e_step), 2**self.Nb - 1)
+            lb = max(int(u_kminus1_ind - Step - e_step), 0)
+
+            # Optimal code within the bounds
+            a = float(np.squeeze(self.C @ init_state))
+            opt_code = mhoq_horizon1(QL_I, a, d, Xcs[j], lb, ub + 1, sorted_levels=QL_I_sorted)
+            C_Store.append(opt_code)
+
+            # Select DAC output based on the quantization model
+            match self.QMODEL:
+                case 1:
+                    U_opt = QL_I[opt_code] 
+                case 2:
+                    U_opt = QL_M[opt_code] 
+
+            # Predict next state based on optimal control input
+            con = U_opt - Xcs[j]
+            init_state = self.state_prediction(init_state, con)  # Update state
+            u_kminus1_ind = opt_code
+
+        return np.array(C_Store).reshape(1, -1)  # Return optimized DAC codes
@@ -19,6 +19,7 @@ import random
 import gurobipy as gp
 from gurobipy import GRB
 import tqdm
+from LM.lin_method_util import MHOQ_SOLVER, use_horizon1, mhoq_horizon1
 
 
 
@@ -66,7 +67,7 @@ class MHOQ_RLIM_RM:
         # return np.floor(X.squeeze() / self.Qstep + 2**(self.Nb - 1))   # Normalize based on bit depth
         return X.squeeze() / self.Qstep + 2**(self.Nb - 1)
 
-    def get_codes(self, N_PRED, Xcs, YQns, MLns, Step):
+    def get_codes(self, N_PRED, Xcs, YQns, MLns, Step, solver=MHOQ_SOLVER.AUTO):
 
         """Computes optimal DAC codes using Mixed-Integer Optimization while minimizing switching frequency.
         
@@ -75,8 +76,12 @@ class MHOQ_RLIM_RM:
         :param YQns: Ideal quantization levels
         :param MLns: Measured quantization levels
         :param Step: Maximum allowable change (step) between consecutive quantization levels
+        :param solver: Optimisation solver (AUTO enumerates the codes when N_PRED = 1, see MHOQ_SOLVER)
         :return: Optimal DAC code sequence
         """
+        if use_horizon1(solver, N_PRED):
+            return self.get_codes_horizon1(Xcs, YQns, MLns, Step)
+
         # # Scale input signals for numerical stability
         Xcs = self.q_scaling(Xcs)  # Scale reference signal
         QL_I = self.q_scaling(YQns)  # Scale reference signal
@@ -181,4 +186,59 @@ class MHOQ_RLIM_RM:
             init_state = self.state_prediction(init_state, con)  # Update state
             u_kminus1_ind =opt_code 
 
-        return np.array(C_Store).reshape(1, -1)  # Return optimized DAC codes
\ No newline at end of file
+        return np.array(C_Store).reshape(1, -1)  # Return optimized DAC codes
+
+
+    def get_codes_horizon1(self, Xcs, YQns, MLns, Step):
+        """Computes optimal DAC codes for prediction horizon 1 without a solver,
+        by evaluating the (scalar quadratic) cost over the reduced code window.
+
+        :param Xcs: Reference input signal to be quantized
+        :param YQns: Ideal quantization levels
+        :param MLns: Measured quantization levels
+        :param Step: Maximum allowable change (step) between consecutive quantization levels
+        :return: Optimal DAC code sequence
+        """
+        Xcs = self.q_scaling(Xcs)  # Scale reference signal
+        QL_I = self.q_scaling(YQns)  # Scale reference signal
+        QL_M = self.q_scaling(MLns)  # Scale reference signal
+        QL_I_sorted = bool(np.all(np.diff(QL_I) > 0))
+        d = float(np.squeeze(self.D))
+
+        C_Store = []  # Storage container for DAC codes
+        len_MPC = Xcs.size - 1  # Number of optimization iterations
+        init_state = np.zeros((self.A.shape[0], 1))  # Initialize state vector to zero
+
+        # Initialize previous control input based on first sample quantization
+        u_kminus1_ind = int(np.floor(Xcs[0]  + 0.5))
+
+        for j in tqdm.tqdm(range(len_MPC), desc='MHOQ_RLIM_RM'):
+            # Constraint set depending on the step size
+            if QL_I_sorted:  # closest level to the previous code
+                idx = int(np.searchsorted(QL_I, u_kminus1_ind))
+                if idx == QL_I.size or (idx > 0 and u_kminus1_ind - QL_I[idx-1] <= QL_I[idx] - u_kminus1_ind):
+                    idx = idx - 1
+            else:
+                idx = np.abs(QL_I - u_kminus1_ind).argmin()
+            e_step = abs(u_kminus1_ind - Xcs[j])
+            lb = int(max(idx - Step - e_step, 0))
+            ub = int(min(idx + Step + e_step, 2**self.Nb-1)) + 1
+
+            # Optimal code within the reduced window
+            a = float(np.squeeze(self.C @ init_state))
+            opt_code = mhoq_horizon1(QL_I, a, d, Xcs[j], lb, ub, sorted_levels=QL_I_sorted)
+            C_Store.append(opt_code)
+
+            # Select DAC output based on the quantization model
+            match self.QMODEL:
+                case 1:
+                    U_opt = QL_I[opt_code] 
+                case 2:
+                    U_opt = QL_M[opt_code] 
+
+            # Predict next state based on optimal control input
+            con = U_opt - Xcs[j]
+            init_state = self.state_prediction(init_state, con)  # Update state
+            u_kminus1_ind = opt_code
+
+        return np.array(C_Store).reshape(1, -1)  # Return optimized DAC codes
@@ -9,25 +9,26 @@
 
 import numpy as np
 import math
+import time
+from enum import Enum, auto
 from scipy import signal
 from utils.balreal import balreal
 
-def nsdcal(X, Dq, YQns, MLns, Qstep, Vmin, Nb, QMODEL):
+try:
+    import numba
+except ImportError:  # optional, the JIT engine falls back to plain Python
+    numba = None
+
+
+class NSD_ENGINE(Enum):
+    LOOP = auto()  # reference per-sample loop (NumPy matrix products)
+    JIT = auto()  # scalar kernel, compiled with Numba if available
+
+
+def ns_filter():
     """
-    X
-        input signal
-    Dq
-        re-quantiser dither
-    YQns, 1d array
-        ideal, uniform output levels (ideal model)
-    MLns, 1d array
-        measured, non-unform levels (calibration model)
-    Qstep, Vmin, Nb
-        quantiser params. (for re-quantisation and code generation)
-    QMODEL
-        choice of quantiser model
-            1: ideal
-            2: measured/calibrated
+    Noise-shaping filter used by NSDCAL, returned as a balanced
+    discrete-time state-space realisation (Ad, Bd, Cd, Dd).
     """
     # Noise-shaping filter (using a simple double integrator)
     # b = np.array([1, -2, 1])
@@ -53,6 +54,34 @@ def nsdcal(X, Dq, YQns, MLns, Qstep, Vmin, Nb, QMODEL):
     # (Useful if having to used fixed-point implementation and/or if the filter order is to be high.)
     # Ad, Bd, Cd, Dd = balreal(Mns.A, Mns.B, Mns.C, Mns.D)
     Ad, Bd, Cd, Dd = balreal(AM, BM, CM, DM)
+    return Ad, Bd, Cd, Dd
+
+
+def nsdcal(X, Dq, YQns, MLns, Qstep, Vmin, Nb, QMODEL, engine=NSD_ENGINE.LOOP):
+    """
+    X
+        input signal
+    Dq
+        re-quantiser dither
+    YQns, 1d array
+        ideal, uniform output levels (ideal model)
+    MLns, 1d array
+        measured, non-unform levels (calibration model)
+    Qstep, Vmin, Nb
+        quantiser params. (for re-quantisation and code generation)
+    QMODEL
+        choice of quantiser model
+            1: ideal
+            2: measured/calibrated
+    engine
+        implementation of the noise-shaping loop (see NSD_ENGINE),
+        all engines produce identical codes
+    """
+    if engine is NSD_ENGINE.JIT:
+        return nsdcal_jit(X, Dq, YQns, MLns, Qstep, Vmin, Nb, QMODEL)
+
+    Ad, Bd, Cd, Dd = ns_filter()
+
     # Initialise state, output and error
     xns = np.zeros((Ad.shape[0], 1))  # noise-shaping filter state
     yns = np.zeros((1, 1))  # noise-shaping filter output
@@ -107,4 +136,236 @@ def nsdcal(X, Dq, YQns, MLns, Qstep, Vmin, Nb, QMODEL):
         xns = Ad@xns + Bd@e  # update state
         yns = Cd@xns  # update filter output
 
-    return C
\ No newline at end of file
+    return C
+
+
+def _nsdcal_kernel(X, Dq, YQns, MLns, Qstep, Vmin, Nb, QMODEL, Ad, Bd, Cd, C):
+    """
+    Scalar implementation of the NSDCAL loop (same arithmetic as nsdcal(),
+    with the matrix products written out), suitable for JIT compilation.
+    Codes are written to C; returns the number of saturated samples.
+    """
+    n = Ad.shape[0]
+    xns = np.zeros(n)  # noise-shaping filter state
+    xns_new = np.zeros(n)
+    yns = 0.0  # noise-shaping filter output
+    e = 0.0  # quantiser error
+
+    c_max = 2**Nb - 1
+    c_off = math.floor(Vmin/Qstep)
+    satcnt = 0
+
+    for i in range(X.size):
+        w = X[i] - yns  # use feedback
+        u = w + Dq[i]  # re-quantizer input
+
+        # Re-quantizer (mid-tread)
+        c = math.floor(u/Qstep + 0.5) - c_off
+
+        # Saturation (can't index out of bounds)
+        if c > c_max:
+            c = c_max
+            satcnt += 1
+        if c < 0:
+            c = 0
+            satcnt += 1
+
+        C[i] = c  # save code
+
+        # Generate error
+        if QMODEL == 1:  # ideal
+            e = YQns[c] - w
+        elif QMODEL == 2:  # measured/calibrated
+            e = MLns[c] - w
+
+        # Noise-shaping filter
+        for r in range(n):
+            acc = 0.0
+            for k in range(n):
+                acc += Ad[r, k]*xns[k]
+            xns_new[r] = acc + Bd[r, 0]*e
+        yns = 0.0
+        for k in range(n):
+            xns[k] = xns_new[k]
+            yns += Cd[0, k]*xns[k]
+
+    return satcnt
+
+
+if numba is not None:
+    _nsdcal_kernel_jit = numba.njit(cache=True)(_nsdcal_kernel)
+else:
+    _nsdcal_kernel_jit = _nsdcal_kernel
+
+
+def _nsdcal_batch_kernel(X, Dq, YQ, ML, Qstep, Vmin, Nb, QMODEL, Ad, Bd, Cd, C, satcnt):
+    """
+    NSDCAL for each row of X with the scalar kernel, the rows run in parallel
+    (numba.prange). The levels YQ, ML have one row, or one row per signal.
+    """
+    for b in numba.prange(X.shape[0]):
+        satcnt[b] = _nsdcal_kernel_jit(X[b], Dq[b], YQ[b % YQ.shape[0]], ML[b % ML.shape[0]],
+                                       Qstep, Vmin, Nb, QMODEL, Ad, Bd, Cd, C[b])
+
+
+if numba is not None:
+    _nsdcal_batch_kernel_jit = numba.njit(parallel=True, cache=True)(_nsdcal_batch_kernel)
+else:
+    _nsdcal_batch_kernel_jit = None  # lock-step NumPy implementation instead, see nsdcal_batch()
+
+
+def nsdcal_jit(X, Dq, YQns, MLns, Qstep, Vmin, Nb, QMODEL):
+    """
+    NSDCAL using a compiled scalar kernel. Same arguments and (bit-identical)
+    codes as nsdcal(). Without Numba installed the kernel runs as plain Python.
+    """
+    Ad, Bd, Cd, Dd = ns_filter()
+
+    X = np.ascontiguousarray(X, dtype=np.float64).reshape(-1)
+    Dq = np.ascontiguousarray(np.broadcast_to(Dq, X.shape), dtype=np.float64)
+    YQns = np.ascontiguousarray(YQns, dtype=np.float64).reshape(-1)
+    MLns = np.ascontiguousarray(MLns, dtype=np.float64).reshape(-1)
+    Cd = np.atleast_2d(Cd)
+
+    C = np.zeros(X.size, dtype=np.int64)  # save codes
+    satcnt = _nsdcal_kernel_jit(X, Dq, YQns, MLns, float(Qstep), float(Vmin), int(Nb), int(QMODEL),
+                                np.ascontiguousarray(Ad), np.ascontiguousarray(Bd), np.ascontiguousarray(Cd), C)
+
+    if satcnt >= 10:
+        print(f'warning: saturation -- cnt: {satcnt}')
+
+    return C.reshape(1, -1)
+
+
+def nsdcal_batch(X, Dq, YQns, MLns, Qstep, Vmin, Nb, QMODEL):
+    """
+    NSDCAL for a stack of input signals (one row per test signal/dither realisation).
+    With Numba the rows run in parallel with the compiled kernel, otherwise all
+    noise-shaper states advance in lock-step with NumPy. Each row gives the same
+    codes as nsdcal() on that row.
+
+    X
+        input signals, 2d array (batch, samples)
+    Dq
+        re-quantiser dither, same shape as X (or broadcastable to it)
+    YQns, MLns
+        ideal and measured levels, 1d array (shared) or 2d array (one row per signal)
+    Qstep, Vmin, Nb, QMODEL
+        as for nsdcal()
+    """
+    Ad, Bd, Cd, Dd = ns_filter()
+    Cd = np.atleast_2d(Cd)
+    n = Ad.shape[0]
+
+    X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+    Dq = np.broadcast_to(np.asarray(Dq, dtype=np.float64), X.shape)
+    Nbatch, Nx = X.shape
+
+    if _nsdcal_batch_kernel_jit is not None:
+        C = np.zeros((Nbatch, Nx), dtype=np.int64)  # save codes
+        satcnt = np.zeros(Nbatch, dtype=np.int64)
+        _nsdcal_batch_kernel_jit(np.ascontiguousarray(X), np.ascontiguousarray(Dq),
+                                 np.ascontiguousarray(np.atleast_2d(YQns), dtype=np.float64),
+                                 np.ascontiguousarray(np.atleast_2d(MLns), dtype=np.float64),
+                                 float(Qstep), float(Vmin), int(Nb), int(QMODEL),
+                                 np.ascontiguousarray(Ad), np.ascontiguousarray(Bd), np.ascontiguousarray(Cd),
+                                 C, satcnt)
+        for b in np.flatnonzero(satcnt >= 10):
+            print(f'warning: saturation in row {b} -- cnt: {satcnt[b]}')
+        return C
+
+    match QMODEL:  # model used in feedback
+        case 1: QL = np.atleast_2d(YQns)  # ideal
+        case 2: QL = np.atleast_2d(MLns)  # measured/calibrated
+    rows = np.arange(Nbatch) if QL.shape[0] > 1 else np.zeros(Nbatch, dtype=int)
+
+    xns = np.zeros((Nbatch, n))  # noise-shaping filter states
+    yns = np.zeros(Nbatch)  # noise-shaping filter outputs
+
+    C = np.zeros((Nbatch, Nx), dtype=np.int64)  # save codes
+    c_max = 2**Nb - 1
+    c_off = math.floor(Vmin/Qstep)
+    satcnt = np.zeros(Nbatch, dtype=int)
+
+    for i in range(Nx):
+        w = X[:, i] - yns  # use feedback
+        u = w + Dq[:, i]  # re-quantizer input
+
+        # Re-quantizer (mid-tread)
+        c = np.floor(u/Qstep + 0.5).astype(np.int64) - c_off
+
+        # Saturation (can't index out of bounds)
+        sat = (c > c_max) | (c < 0)
+        satcnt += sat
+        c = np.clip(c, 0, c_max)
+
+        C[:, i] = c  # save code
+
+        # Generate error
+        e = QL[rows, c] - w
+
+        # Noise-shaping filter (products summed in the same order as Ad@xns)
+        xns_new = np.empty_like(xns)
+        for r in range(n):
+            acc = Ad[r, 0]*xns[:, 0]
+            for k in range(1, n):
+                acc = acc + Ad[r, k]*xns[:, k]
+            xns_new[:, r] = acc + Bd[r, 0]*e
+        xns = xns_new
+        yns = Cd[0, 0]*xns[:, 0]
+        for k in range(1, n):
+            yns = yns + Cd[0, k]*xns[:, k]
+
+    for b in np.flatnonzero(satcnt >= 10):
+        print(f'warning: saturation in row {b} -- cnt: {satcnt[b]}')
+
+    return C
+
+
+def main():
+    """
+    Test the engines for identical codes and compare throughput (samples/second).
+    """
+    Nb = 16
+    Vmin, Vmax = -10, 10
+    Qstep = (Vmax - Vmin)/(2**Nb - 1)
+    YQns = np.linspace(Vmin, Vmax, 2**Nb)
+    MLns = YQns + Qstep*np.random.uniform(-2, 2, YQns.size)  # emulated INL
+
+    Fs = 1e7
+    t = np.arange(0, 7/5e3, 1/Fs)
+    X = 0.9*(Vmax - Qstep)*np.cos(2*np.pi*5e3*t)
+    Dq = Qstep*(np.random.uniform(-0.5, 0.5, t.size) + np.random.uniform(-0.5, 0.5, t.size))
+
+    nsdcal(X[:10], Dq[:10], YQns, MLns, Qstep, Vmin, Nb, 2, engine=NSD_ENGINE.JIT)  # compile
+
+    rates = {}
+    for engine in NSD_ENGINE:
+        t0 = time.perf_counter()
+        C = nsdcal(X, Dq, YQns, MLns, Qstep, Vmin, Nb, 2, engine=engine)
+        rates[engine] = X.size/(time.perf_counter() - t0)
+        if engine is NSD_ENGINE.LOOP:
+            C_ref = C
+        print(f'{engine.name}: {rates[engine]:.3g} samples/s, identical codes: {np.array_equal(C, C_ref)}')
+
+    print(f'speed-up: {rates[NSD_ENGINE.JIT]/rates[NSD_ENGINE.LOOP]:.1f}x (Numba: {numba is not None})')
+
+    # Batched run over a sweep of reference frequencies
+    Nbatch = 100
+    Fx = np.linspace(1e3, 100e3, Nbatch)
+    Xb = 0.9*(Vmax - Qstep)*np.cos(2*np.pi*np.outer(Fx, t))
+    Dqb = Qstep*(np.random.uniform(-0.5, 0.5, Xb.shape) + np.random.uniform(-0.5, 0.5, Xb.shape))
+
+    nsdcal_batch(Xb[:2, :10], Dqb[:2, :10], YQns, MLns, Qstep, Vmin, Nb, 2)  # compile
+
+    t0 = time.perf_counter()
+    Cb = nsdcal_batch(Xb, Dqb, YQns, MLns, Qstep, Vmin, Nb, 2)
+    rate_b = Xb.size/(time.perf_counter() - t0)
+    same = all(np.array_equal(Cb[k:k+1], nsdcal(Xb[k], Dqb[k], YQns, MLns, Qstep, Vmin, Nb, 2, engine=NSD_ENGINE.JIT))
+               for k in range(Nbatch))
+    threads = numba.get_num_threads() if numba is not None else 1
+    print(f'BATCH ({Nbatch} rows, {threads} threads): {rate_b:.3g} samples/s, identical codes: {same}')
+
+
+if __name__ == "__main__":
+    main()
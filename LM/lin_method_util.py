@@ -8,6 +8,7 @@
 """
 
 from enum import Enum, auto
+import numpy as np
 
 class lm(Enum):  # linearisation method
     BASELINE = auto()  # baseline
@@ -76,6 +77,51 @@ class dm:  # DAC model
                 return '-'
 
 
+class MHOQ_SOLVER(Enum):  # solver for the MHOQ/MPC optimisation problem
+    AUTO = auto()  # enumeration for prediction horizon 1, Gurobi otherwise
+    GUROBI = auto()  # mixed-integer program solved by Gurobi
+    ENUM = auto()  # solver-free enumeration (prediction horizon 1 only)
+    SPHERE = auto()  # solver-free sphere decoding (tree search, any prediction horizon)
+
+
+def use_horizon1(solver, N_PRED):
+    """
+    Whether the solver-free horizon-1 path should be used for a given solver choice.
+    """
+    if solver is MHOQ_SOLVER.ENUM and N_PRED != 1:
+        raise ValueError('MHOQ_SOLVER.ENUM requires N_PRED = 1.')
+    return solver is MHOQ_SOLVER.ENUM or (solver is MHOQ_SOLVER.AUTO and N_PRED == 1)
+
+
+def mhoq_horizon1(QL, a, d, x, lb=0, ub=None, sorted_levels=False):
+    """
+    Solve the MHOQ problem with prediction horizon 1, i.e. find the code c in [lb, ub)
+    minimising the scalar quadratic cost (a + d*(QL[c] - x))**2.
+
+    Arguments
+        QL - levels used in the objective (one per code)
+        a - filter output due to the current state (C@x0)
+        d - filter feed-through (D)
+        x - reference
+        lb, ub - admissible code window (ub exclusive, defaults to all codes)
+        sorted_levels - QL is strictly increasing (bisect instead of evaluating the window)
+
+    Returns
+        c - optimal code
+    """
+    if ub is None:
+        ub = QL.size
+
+    if sorted_levels and d != 0:
+        # the optimum is one of the two levels around the unconstrained optimum
+        v = x - a/d
+        k = lb + int(np.searchsorted(QL[lb:ub], v))
+        lb, ub = max(k - 1, lb), min(k, ub - 1) + 1
+
+    cost = (a + d*(QL[lb:ub] - x))**2
+    return lb + int(np.argmin(cost))
+
+
 def main():
     """
     Test
@@ -1,23 +1,249 @@
-import subprocess
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Run sweeps of DAC simulations (run_me.simulate) over a parameter grid
+
+The simulations run in a pool of worker processes. Each worker imports the
+simulation code and loads the level measurements once (pool initialiser),
+and the results are appended to the ENOB CSV file as they complete.
+
+A sweep can be described in a spec file (TOML or JSON) with the settings of
+run_me.py as keys; lists are swept (Cartesian product), scalars are fixed,
+enums are given by name and ranges as {start, stop, step} (stop exclusive):
+
+    RUN_LM = ["NSDCAL", "MPC"]
+    QConfig = ["w_8bit_NI_card", "w_16bit_NI_card"]
+    Xref_FREQ = [{start = 1000, stop = 10000, step = 1000}, 20000]
+    Slew_rate = [7, 10]
+    FS_CHOICE = 1
+
+Completed points are recorded in a journal (JSON lines with the sweep point, the
+sim_config hash of the generated codes and run_me.CODES_VERSION), so an interrupted
+sweep resumes where it stopped (entries of another codes version are run again):
+
+    python run_me_wrapper.py sweeps/nsdcal_ni_cards.toml
+
+@date: 16.10.2026
+@license: BSD 3-Clause
+"""
+
+import itertools
+import json
+import os
+import argparse
+import tomllib
+from enum import Enum
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import tqdm
 import numpy as np
 from LM.lin_method_util import lm
 from utils.quantiser_configurations import qs
+from utils.figures_of_merit import SINAD_COMP
+
+SPEC_ENUMS = {'RUN_LM': lm, 'QConfig': qs, 'SINAD_COMP_SEL': SINAD_COMP}  # settings given by enum name
+
+
+def sweep_grid(**params):
+    """
+    Cartesian product of the given settings (lists of values), as run_me.simulate() configurations.
+    The setting names are the same as in run_me.py (e.g. QConfig, Xref_FREQ, RUN_LM).
+    """
+    keys = list(params.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*params.values())]
+
+
+def _spec_values(key, value):
+    """
+    Values of a setting in a sweep spec: enum names, ranges and scalars to a list.
+    """
+    values = []
+    for v in (value if isinstance(value, list) else [value]):
+        if isinstance(v, dict):  # range
+            values.extend(np.arange(v['start'], v['stop'], v.get('step', 1)).tolist())
+        elif key in SPEC_ENUMS:
+            values.append(SPEC_ENUMS[key][v])
+        else:
+            values.append(v)
+    return values
+
+
+def load_sweep_spec(path):
+    """
+    Read a sweep spec file (TOML or JSON, see the module doc.) and return
+    the configurations for run_me.simulate(), TEST_CASE 0 unless specified.
+    """
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path, 'r') as fin:
+            spec = json.load(fin)
+    else:
+        with open(path, 'rb') as fin:
+            spec = tomllib.load(fin)
+
+    spec.setdefault('TEST_CASE', 0)
+    return sweep_grid(**{key: _spec_values(key, value) for key, value in spec.items()})
+
+
+def _to_json(obj):
+    if isinstance(obj, Enum):
+        return obj.name
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f'Cannot serialise {type(obj)}')
+
+
+def point_key(config):
+    """
+    Canonical text of a sweep point (settings sorted by name, enums by name).
+    """
+    return json.dumps(config, sort_keys=True, default=_to_json)
+
+
+def load_journal(path, version=None):
+    """
+    Read a sweep journal.
+
+    Arguments
+        path - journal file
+        version - codes version (run_me.CODES_VERSION); entries of other versions are skipped
+
+    Returns
+        entries - dict of journal entries keyed by the sim_config hash
+        finished - dict of the results of the completed points keyed by point_key()
+    """
+    entries = {}
+    finished = {}
+    if os.path.exists(path):
+        with open(path, 'r') as fin:
+            for line in fin:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:  # partly written entry (interrupted), run again
+                    continue
+                if version is not None and entry.get('version') != version:  # stale codes, run again
+                    continue
+                entries[entry['hash']] = entry
+                finished[entry['point']] = entry['result']  # points may share a hash (same codes)
+    return entries, finished
+
+
+def _journal_append(path, point, version, result):
+    with open(path, 'a') as fout:
+        fout.write(json.dumps({'hash': result['hash'], 'point': point, 'version': version, 'result': result},
+                              default=_to_json) + '\n')
+        fout.flush()
+        os.fsync(fout.fileno())
+
+
+def _init_worker(qconfigs, methods):
+    """
+    Pool initialiser: imports and level tables loaded once per worker process.
+    """
+    import matplotlib
+    matplotlib.use('Agg')  # no figure windows from the workers
+
+    import run_me  # noqa: F401 (imports NumPy/SciPy/gurobipy etc.)
+    from utils.quantiser_configurations import get_measured_levels
+    for qconfig, method in itertools.product(qconfigs, methods):
+        try:
+            get_measured_levels(qconfig, method)
+        except SystemExit:  # no measurements for this config., fails in simulate() if needed
+            pass
+
+
+def _simulate(config):
+    from matplotlib import pyplot as plt
+    import run_me
+    try:
+        return run_me.simulate(config)
+    finally:
+        plt.close('all')  # figures are not shown, free them
+
+
+def run_sweep(configs, workers=None, save=True, journal=None):
+    """
+    Run run_me.simulate() for all configurations in a process pool.
+
+    Arguments
+        configs - list of configurations (dicts, e.g. from sweep_grid() or load_sweep_spec())
+        workers - number of worker processes (default os.cpu_count())
+        save - append the results to the ENOB CSV file as they complete (single writer),
+               and save the code CSV of each point (by the workers, one file per point)
+        journal - journal file; points completed in it with the current codes version are skipped
+                  (their results are returned from the journal), and new points are added as they complete
+
+    Returns
+        results - list of results in the order of configs (None for failed runs)
+    """
+    from utils.save_csv import save_enob_sinad_slew
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    points = [point_key(config) for config in configs]
+    results = [None]*len(configs)
+    if journal is not None:
+        from run_me import CODES_VERSION
+        _, finished = load_journal(journal, CODES_VERSION)
+        for k, point in enumerate(points):
+            if point in finished:
+                results[k] = finished[point]
+        print(f'Journal {journal}: {len(configs) - results.count(None)} of {len(configs)} points done')
+    todo = [k for k in range(len(configs)) if results[k] is None]
+
+    # ENOB results are saved here (single writer), not by the workers
+    configs = [dict(config, SAVE_ENOB=False, SAVE_CODE=save, PLOTS=False) for config in configs]
+    qconfigs = {config.get('QConfig') for config in configs} - {None}
+    methods = {config.get('RUN_LM') for config in configs} - {None}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(qconfigs, methods)) as pool:
+        futures = {pool.submit(_simulate, configs[k]): k for k in todo}
+        for f in tqdm.tqdm(as_completed(futures), total=len(futures), desc='Progressing run_me_wrapper'):
+            k = futures[f]
+            try:
+                result = f.result()
+            except (Exception, SystemExit) as err:  # keep going with the rest of the sweep
+                print(f'Failed: {configs[k]}: {err!r}')
+                continue
+            results[k] = result
+            if journal is not None and result is not None:
+                _journal_append(journal, points[k], CODES_VERSION, result)
+            if save and result is not None:
+                save_enob_sinad_slew(result['QConfig'], result['LM'], result['Fx'], result['Fc'],
+                                     result['ENOB'], result['SINAD'], result['SLEW_ERROR'])
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('spec', nargs='?', help='sweep spec file (TOML or JSON)')
+    parser.add_argument('--journal', help='sweep journal file (default: <spec>.journal.jsonl)')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    if args.spec is not None:
+        configs = load_sweep_spec(args.spec)
+        journal = args.journal or os.path.splitext(args.spec)[0] + '.journal.jsonl'
+    else:
+        a = np.arange(100,1000,100)
+        b = np.arange(1000,10000,1000)
+        c = np.arange(10000,100000+1000,1000)
+        qconfigs = [qs.w_4bit_NI_card, qs.w_6bit_NI_card, qs.w_8bit_NI_card, qs.w_10bit_NI_card, qs.w_12bit_NI_card, qs.w_14bit_NI_card, qs.w_16bit_NI_card]
+        # qconfigs = [qs.w_8bit_NI_card, qs.w_16bit_NI_card]
+        xref_freq = np.concatenate([a,b,c])
+        step = 1
+
+        # same settings as with the run_me.py CLI (TEST_CASE 0)
+        configs = sweep_grid(QConfig=qconfigs,
+                             Xref_FREQ=[int(fx) for fx in xref_freq],
+                             TEST_CASE=[0],
+                             MPC_step_limit=[step],
+                             RUN_LM=[lm.NSDCAL],
+                             Slew_rate=[7],
+                             Fc_lp=[100e3],
+                             Fs_Scope=[1e7],
+                             FS_CHOICE=[1])
+        journal = args.journal
 
-a = np.arange(100,1000,100)
-b = np.arange(1000,10000,1000)
-c = np.arange(10000,100000+1000,1000)
-qconfigs = [qs.w_4bit_NI_card, qs.w_6bit_NI_card, qs.w_8bit_NI_card, qs.w_10bit_NI_card, qs.w_12bit_NI_card, qs.w_14bit_NI_card, qs.w_16bit_NI_card]
-# qconfigs = [qs.w_8bit_NI_card, qs.w_16bit_NI_card]
-xref_freq = np.concatenate([a,b,c])
-step = 1
-with tqdm.tqdm(xref_freq, desc="Progressing run_me_wrapper") as pbar:
-    for qconfig in qconfigs:
-        for fs in pbar:
-            subprocess.run([
-                'python', 'run_me.py',
-                '--TEST_CASE', '0',
-                '--Xref_FREQ', str(fs),
-                '--MPC_step_limit', str(step),
-                '--METHOD_CHOICE', str(lm.NSDCAL.value),
-                '--QConfig', str(qconfig.value)])
\ No newline at end of file
+    run_sweep(configs, workers=args.workers, journal=journal)
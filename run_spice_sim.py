@@ -31,6 +31,7 @@ from utils.spice_utils import run_spice_sim, run_spice_sim_parallel, gen_spice_s
 from utils.inl_processing import get_physcal_gain
 from utils.figures_of_merit import eval_enob_sinad, SINAD_COMP
 from utils.static_dac_model import reconstruction_filter
+from utils.code_storage import load_codes_dir
 
 # choose method
 METHOD_CHOICE = 7
@@ -104,12 +105,7 @@ if QConfig in [qs.w_6bit_2ch_SPICE, qs.w_16bit_2ch_SPICE, qs.w_10bit_2ch_SPICE]:
 else:
     SEPARATE_FILE_PER_CHANNEL = True
 
-codes_fn = 'codes.npy'  # TODO: magic constant, name of codes file
-
-if os.path.exists(os.path.join(method_d, codes_d, codes_fn)):  # codes exists
-    C = np.load(os.path.join(method_d, codes_d, codes_fn))
-else:
-    raise SystemExit('No codes file found.')
+C = load_codes_dir(os.path.join(method_d, codes_d))  # memory-mapped uint8/uint16 codes
 
 if SEPARATE_FILE_PER_CHANNEL:
     for k in range(0,Nch):
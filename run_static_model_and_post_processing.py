@@ -22,7 +22,7 @@ import tqdm
 # from pathlib import Path
 
 from utils.results import handle_results
-from utils.static_dac_model import generate_dac_output, quantise_signal, generate_codes, quantiser_type, slew_model, reconstruction_filter
+from utils.static_dac_model import generate_dac_output, quantise_signal, generate_codes, quantiser_type, slew_model, slew_model_pwl, reconstruction_filter
 from utils.quantiser_configurations import quantiser_configurations, get_measured_levels, qs
 from utils.spice_utils import run_spice_sim, run_spice_sim_parallel, gen_spice_sim_file, read_spice_bin_file
 from LM.lin_method_util import lm, dm
@@ -30,9 +30,10 @@ from utils.figures_of_merit import eval_enob_sinad, eval_slew_distortion, eval_s
 from utils.test_util import sim_config, test_signal_sine
 from utils.inl_processing import get_physcal_gain
 from utils.save_csv import save_enob_sinad_slew, save_code, save_slew_error
+from utils.code_storage import load_codes_dir
 
 
-def run_static_model_and_post_processing(RUN_LM, hash_stamp, MAKE_PLOT=False, SAVE=False):
+def run_static_model_and_post_processing(RUN_LM, hash_stamp, MAKE_PLOT=False, SAVE=False, SLEW_PWL=False, SAVE_CODE=None):
 
     top_d = 'generated_codes/'  # directory for generated codes and configuration info
     method_d = os.path.join(top_d, str(lm(RUN_LM)))
@@ -67,12 +68,7 @@ def run_static_model_and_post_processing(RUN_LM, hash_stamp, MAKE_PLOT=False, SA
     Xref = SC.xref
     Fs_scope = SC.fs_scope
 
-    codes_fn = 'codes.npy'  # TODO: magic constant, name of codes file
-
-    if os.path.exists(os.path.join(method_d, codes_d, codes_fn)):  # codes exists
-        C = np.load(os.path.join(method_d, codes_d, codes_fn))
-    else:
-        raise SystemExit('No codes file found.')
+    C = load_codes_dir(os.path.join(method_d, codes_d))  # memory-mapped uint8/uint16 codes
 
     # time vector
     t = SC.t
@@ -90,7 +86,7 @@ def run_static_model_and_post_processing(RUN_LM, hash_stamp, MAKE_PLOT=False, SA
         ML = np.resize(ML, (C.shape[0], ML.shape[1]))
 
     # generate output
-    YM = generate_dac_output(C.astype(int), ML)  # using measured or randomised levels
+    YM = generate_dac_output(C, ML)  # using measured or randomised levels
 
     # calculate min max step sizes
     diff = np.diff(C.astype(int))
@@ -100,7 +96,13 @@ def run_static_model_and_post_processing(RUN_LM, hash_stamp, MAKE_PLOT=False, SA
 
     # use slew model
     ts_scope = 1/Fs_scope
-    YMs, YMs_scope, t_scope = slew_model(YM, Ts, Sr, t, ts_scope, mode=1)
+    if SLEW_PWL:  # piecewise-linear slewing, evaluated at the DAC sample times (no scope arrays)
+        YMs_pwl = slew_model_pwl(YM, Ts, Sr, t)
+        Fs_scope = Fs
+        t_scope = t[0:YM.shape[1]]
+        YMs_scope = np.array([np.interp(t_scope, tb, yb) for tb, yb in zip(*YMs_pwl)])
+    else:
+        YMs, YMs_scope, t_scope = slew_model(YM, Ts, Sr, t, ts_scope, mode=1)
 
     # Summation stage
     # TODO: Generalize the gain K. Current solution is creates errors depending on number of channel (typical Nch=1)
@@ -131,8 +133,8 @@ def run_static_model_and_post_processing(RUN_LM, hash_stamp, MAKE_PLOT=False, SA
     Nf = SC.nf
 
     # Reconstruction filter
-    ym_rf = reconstruction_filter(t, YM, Fc, Fs, Nf)
-    yms_scope_rf = reconstruction_filter(t_scope, YMs_scope, Fc, Fs_scope, Nf)
+    ym_rf = reconstruction_filter(t, YM, Fc, Fs, Nf, mode=4)
+    yms_scope_rf = reconstruction_filter(t_scope, YMs_pwl if SLEW_PWL else YMs_scope, Fc, Fs_scope, Nf, mode=4)
 
     # Eval slew distortion
     slew_error, slew_error_rms = eval_slew_distortion(YM, YMs_scope, t, t_scope, print_results=True, plot_results=MAKE_PLOT, title='priod RF')
@@ -158,6 +160,9 @@ def run_static_model_and_post_processing(RUN_LM, hash_stamp, MAKE_PLOT=False, SA
     
     if SAVE: 
         save_enob_sinad_slew(QConfig.name, lin.name, Fx, Fc, [ENOB, ENOB_SLEWED], [SINAD, SINAD_SLEWED], slew_error_rms)
+    if SAVE_CODE is None:  # code CSV, one file per run
+        SAVE_CODE = SAVE
+    if SAVE_CODE:
         save_code(QConfig.name, lin.name, Fx, Fc, t, c)
 
     if MAKE_PLOT:
@@ -207,5 +212,8 @@ def run_static_model_and_post_processing(RUN_LM, hash_stamp, MAKE_PLOT=False, SA
         
         plt.show()
 
+    return {'hash': hash_stamp, 'QConfig': QConfig.name, 'LM': lin.name, 'Fx': Fx, 'Fc': Fc,
+            'ENOB': [ENOB, ENOB_SLEWED], 'SINAD': [SINAD, SINAD_SLEWED], 'SLEW_ERROR': slew_error_rms}
+
 
 # def eval_codes:
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Compact binary storage of generated DAC codes
+
+Codes are stored with the smallest unsigned integer type for the resolution
+(uint8 up to 8 bits, uint16 up to 16 bits) after a small header with the
+resolution, number of channels, length and sampling rate. Uncompressed files
+are loaded memory-mapped (read-only).
+
+Optionally, the codes are delta encoded along time (modulo 2^bits) and
+compressed (zstd if the zstandard package is available, otherwise zlib);
+this suits noise-shaped codes with small steps between samples, but the
+file has to be decompressed when loaded.
+
+@date: 16.10.2026
+@license: BSD 3-Clause
+"""
+
+import os
+import zlib
+import numpy as np
+from enum import Enum, auto
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class CODES_COMPRESSION(Enum):
+    NONE = auto()  # raw codes (memory-mapped when loaded)
+    ZLIB = auto()  # delta encoded, zlib
+    ZSTD = auto()  # delta encoded, zstd (needs zstandard)
+
+
+CODES_MAGIC = b'DACC'
+CODES_HEADER = np.dtype([('magic', 'S4'),
+                         ('version', 'u1'),
+                         ('nb', 'u1'),  # resolution (no. of bits)
+                         ('compression', 'u1'),  # CODES_COMPRESSION value
+                         ('reserved', 'u1'),
+                         ('nch', '<u4'),  # no. of channels
+                         ('n', '<u8'),  # no. of samples per channel
+                         ('fs', '<f8')])  # sampling rate
+
+
+def code_dtype(Nb):
+    """
+    Smallest unsigned integer type holding Nb bit codes.
+    """
+    if Nb <= 8:
+        return np.dtype('u1')
+    elif Nb <= 16:
+        return np.dtype('<u2')
+    elif Nb <= 32:
+        return np.dtype('<u4')
+    raise ValueError('Unsupported resolution.')
+
+
+def save_codes(filename, C, Nb, Fs, compression=CODES_COMPRESSION.NONE):
+    """
+    Save codes to a binary file.
+
+    Arguments
+        filename - output file
+        C - codes, one channel per row, integer valued in [0, 2**Nb - 1] (any numeric type)
+        Nb - resolution (no. of bits)
+        Fs - sampling rate
+        compression - see CODES_COMPRESSION (ZSTD falls back to ZLIB without zstandard)
+    """
+    C = np.atleast_2d(C)
+    dtype = code_dtype(Nb)
+    if C.size and (np.any(C != np.round(C)) or np.min(C) < 0 or np.max(C) > 2**Nb - 1):
+        raise ValueError('Codes are not integers in the range of the resolution.')
+    Cs = np.ascontiguousarray(C, dtype=dtype)
+
+    if compression is CODES_COMPRESSION.ZSTD and zstandard is None:
+        compression = CODES_COMPRESSION.ZLIB
+
+    header = np.zeros(1, dtype=CODES_HEADER)
+    header['magic'] = CODES_MAGIC
+    header['version'] = 1
+    header['nb'] = Nb
+    header['compression'] = compression.value
+    header['nch'], header['n'] = Cs.shape
+    header['fs'] = Fs
+
+    with open(filename, 'wb') as fout:
+        fout.write(header.tobytes())
+        match compression:
+            case CODES_COMPRESSION.NONE:
+                fout.write(Cs.tobytes())
+            case CODES_COMPRESSION.ZLIB | CODES_COMPRESSION.ZSTD:
+                D = np.diff(Cs, axis=1, prepend=np.zeros((Cs.shape[0], 1), dtype=dtype))  # wraps around
+                if compression is CODES_COMPRESSION.ZSTD:
+                    fout.write(zstandard.ZstdCompressor(level=9).compress(D.tobytes()))
+                else:
+                    fout.write(zlib.compress(D.tobytes(), level=9))
+
+
+def load_codes(filename, mmap=True):
+    """
+    Load codes from a binary file (see save_codes()).
+
+    Arguments
+        filename - input file
+        mmap - memory-map uncompressed codes (read-only), otherwise read into memory
+
+    Returns
+        C - codes, one channel per row (uint8/uint16)
+        header - dict with the resolution (Nb), no. of channels (Nch), sampling rate (Fs) and compression
+    """
+    with open(filename, 'rb') as fin:
+        header = np.frombuffer(fin.read(CODES_HEADER.itemsize), dtype=CODES_HEADER)[0]
+        if header['magic'] != CODES_MAGIC:
+            raise ValueError('Not a codes file.')
+        dtype = code_dtype(int(header['nb']))
+        shape = (int(header['nch']), int(header['n']))
+        compression = CODES_COMPRESSION(int(header['compression']))
+
+        match compression:
+            case CODES_COMPRESSION.NONE:
+                if mmap:
+                    C = np.memmap(filename, dtype=dtype, mode='r', offset=CODES_HEADER.itemsize, shape=shape)
+                else:
+                    C = np.fromfile(fin, dtype=dtype, count=shape[0]*shape[1]).reshape(shape)
+            case CODES_COMPRESSION.ZLIB | CODES_COMPRESSION.ZSTD:
+                if compression is CODES_COMPRESSION.ZSTD:
+                    if zstandard is None:
+                        raise ImportError('zstandard is needed to load zstd compressed codes.')
+                    raw = zstandard.ZstdDecompressor().decompress(fin.read())
+                else:
+                    raw = zlib.decompress(fin.read())
+                D = np.frombuffer(raw, dtype=dtype).reshape(shape)
+                C = np.cumsum(D, axis=1, dtype=dtype)  # wraps around
+
+    return C, {'Nb': int(header['nb']), 'Nch': shape[0], 'Fs': float(header['fs']), 'compression': compression}
+
+
+def load_codes_dir(codes_d):
+    """
+    Load the codes in a generated codes directory: codes.bin, or codes.npy (older runs).
+    """
+    if os.path.exists(os.path.join(codes_d, 'codes.bin')):
+        C, _ = load_codes(os.path.join(codes_d, 'codes.bin'))
+    elif os.path.exists(os.path.join(codes_d, 'codes.npy')):
+        C = np.load(os.path.join(codes_d, 'codes.npy'), mmap_mode='r')
+        if not np.issubdtype(C.dtype, np.integer):  # e.g. stacked with np.zeros
+            C = C.astype(int)
+    else:
+        raise SystemExit('No codes file found.')
+    return C
+
+
+def main():
+    """
+    Check the round trip and compare the file sizes with np.save of int64 codes.
+    """
+    import tempfile
+    import time
+
+    rng = np.random.default_rng(1)
+    N = 10**6
+    for Nb in [6, 8, 12, 16]:
+        # noise-shaped like codes: a sinusoid plus small random steps
+        c = (2**(Nb-1) - 1)*(1 + 0.9*np.sin(2*np.pi*np.arange(N)/5000)) + rng.integers(-2, 3, N)
+        C = np.clip(np.round(c), 0, 2**Nb - 1).astype(np.int64).reshape(1, -1)
+
+        with tempfile.TemporaryDirectory() as tmp_d:
+            np.save(os.path.join(tmp_d, 'codes.npy'), C)
+            size_npy = os.path.getsize(os.path.join(tmp_d, 'codes.npy'))
+            for compression in CODES_COMPRESSION:
+                f = os.path.join(tmp_d, 'codes.bin')
+                save_codes(f, C, Nb, 1e6, compression)
+                t0 = time.perf_counter()
+                C_l, header = load_codes(f)
+                dt = time.perf_counter() - t0
+                print(f'Nb={Nb} {header["compression"].name}: {C_l.dtype}, {size_npy/os.path.getsize(f):.1f}x smaller '
+                      f'than int64 .npy, load {dt*1e3:.2f} ms, identical: {np.array_equal(C_l, C)}')
+                del C_l
+
+
+if __name__ == "__main__":
+    main()
@@ -22,22 +22,28 @@ from scipy import signal
 from scipy import integrate
 from matplotlib import pyplot as plt
 
-from utils.welch_psd import welch_psd
-from utils.psd_measurements import find_psd_peak
-from utils.fit_sinusoid import fit_sinusoid, sin_p
+from utils.welch_psd import welch_psd, welch_psd_stream
+from utils.psd_measurements import find_psd_peak, psd_harmonics, thd_sfdr
+from utils.fit_sinusoid import fit_sinusoid, fit_sinusoid_ieee, sin_p
 
 class SINAD_COMP(Enum):
     FFT = auto()  # FFT based
     CFIT = auto()  # curve fit
+    CFIT_3P = auto()  # IEEE Std 1057 three-parameter sine fit (FFT frequency estimate)
+    CFIT_4P = auto()  # IEEE Std 1057 four-parameter sine fit
 
-def TS_SINAD(x, t, y_fit=None, make_plot=False, plot_label=''):
+def TS_SINAD(x, t, y_fit=None, make_plot=False, plot_label='', n_param=None):
     """
     Take a time-series for computation of the SINAD using a curve-fitting method.
     Use at least 5 periods of the fundamental carrier signal for a good estimate
     (as prescribed in IEEE Std 1658-2011).
+    n_param selects the IEEE Std 1057 three- or four-parameter fit (None: curve_fit).
     """
 
-    p_opt = fit_sinusoid(t, x, 1)
+    if n_param is None:
+        p_opt = fit_sinusoid(t, x, 1)
+    else:
+        p_opt = fit_sinusoid_ieee(t, x, n_param)
     # print("p_opt: ", p_opt)  # fitted params.
     # p_opt[0] = 9.92156862745098
     x_fit = sin_p(t, *p_opt)
@@ -67,17 +73,26 @@ def TS_SINAD(x, t, y_fit=None, make_plot=False, plot_label=''):
     return SINAD
 
 
-def FFT_SINAD(x, Fs, make_plot=False, plot_label=''):
+def FFT_SINAD(x, Fs, make_plot=False, plot_label='', N=None):
     """
     Take a time-series for computation of the SINAD using an FFT-based method.
     Typically needs a fairly long time-series for sufficient frequency resolution.
     Rule of thumb: More than 100 periods of the fundamental carrier.
+
+    Memory-mapped arrays, and iterables of chunks (e.g. a generator, then the length N
+    must be given), are processed segment by segment (streaming PSD estimate).
     """
 
     L = 4  # number of averages for PSD estimation
 
-    N = x.size  # length of original sequence
+    if N is None:
+        N = x.size  # length of original sequence
     M = math.floor(N/L)  # length of sequence segments
+
+    if isinstance(x, np.memmap) or not isinstance(x, np.ndarray):
+        Pxx, f = welch_psd_stream(x, L, Fs, N=N)
+        return PSD_SINAD(Pxx, f, Fs, M, make_plot, plot_label)
+
     WIN = np.kaiser(M, 38)  # window for high dynamic range
 
     match 1:
@@ -87,6 +102,17 @@ def FFT_SINAD(x, Fs, make_plot=False, plot_label=''):
             # use library fcn.
             f, Pxx = signal.welch(x, window=WIN, fs=Fs)  # type: ignore
 
+    return PSD_SINAD(Pxx, f, Fs, M, make_plot, plot_label)
+
+
+def PSD_SINAD(Pxx, f, Fs, M, make_plot=False, plot_label=''):
+    """
+    SINAD from a (one-sided) PSD estimate with Kaiser-windowed segments of length M
+    (e.g. from welch_psd() or a streaming estimate, see FFT_SINAD()).
+    """
+
+    WIN = np.kaiser(M, 38)  # window for high dynamic range
+
     df = np.mean(np.diff(f))
 
     # approximate noise floor
@@ -165,6 +191,28 @@ def FFT_SINAD(x, Fs, make_plot=False, plot_label=''):
 
     return SINAD
 
+def FFT_THD_SFDR(x, Fs, K=5, spur_th=None):
+    """
+    THD (dBc, harmonics 2 to K) and SFDR (dB) from the same PSD estimate as FFT_SINAD(),
+    with DC, fundamental, harmonics and spurs extracted in one pass (see psd_harmonics()).
+    Also returns the table of peaks.
+    """
+
+    L = 4  # number of averages for PSD estimation
+
+    M = math.floor(x.size/L)  # length of sequence segments
+    WIN = np.kaiser(M, 38)  # window for high dynamic range
+
+    Pxx, f = welch_psd(x, L, Fs)
+
+    # equiv. noise bandwidth
+    EQNBW = (np.mean(WIN**2)/((np.mean(WIN))**2))*(Fs/M)
+
+    peaks = psd_harmonics(Pxx, f, Fs, EQNBW, K, spur_th)
+    THD, SFDR = thd_sfdr(peaks)
+
+    return THD, SFDR, peaks
+
 def eval_enob_sinad(ty, y, Fs, TRANSOFF, SINAD_COMP_SEL:SINAD_COMP, print_results=True, plot=False, descr='', y_ref=None):
     match SINAD_COMP_SEL:
         case SINAD_COMP.FFT:  # use FFT based method to detemine SINAD
@@ -172,6 +220,10 @@ def eval_enob_sinad(ty, y, Fs, TRANSOFF, SINAD_COMP_SEL:SINAD_COMP, print_result
         case SINAD_COMP.CFIT:  # use time-series sine fitting based method to detemine SINAD
             y = y.reshape(1, -1).squeeze()
             SINAD = TS_SINAD(y[TRANSOFF:-TRANSOFF], ty[TRANSOFF:-TRANSOFF], y_ref, plot, descr)
+        case SINAD_COMP.CFIT_3P | SINAD_COMP.CFIT_4P:  # IEEE Std 1057 sine fit
+            y = y.reshape(1, -1).squeeze()
+            n_param = 3 if SINAD_COMP_SEL is SINAD_COMP.CFIT_3P else 4
+            SINAD = TS_SINAD(y[TRANSOFF:-TRANSOFF], ty[TRANSOFF:-TRANSOFF], y_ref, plot, descr, n_param)
 
     ENOB = (SINAD - 1.76)/6.02
 
@@ -181,15 +233,31 @@ def eval_enob_sinad(ty, y, Fs, TRANSOFF, SINAD_COMP_SEL:SINAD_COMP, print_result
 
     return ENOB, SINAD
 
-def eval_slew_distortion(y, y_slewed, t, t_slewed, print_results=False, plot_results=False, title=''):
+def eval_slew_distortion(y, y_slewed, t, t_slewed, print_results=False, plot_results=False, title='', anti_alias=False):
+    # Piecewise-linear breakpoints (tb, yb) from slew_model_pwl(), evaluate on t
+    if isinstance(y_slewed, tuple):
+        tb, yb = y_slewed
+        y_slewed = np.array([np.interp(t, tb[i], yb[i]) for i in range(tb.shape[0])])
+        t_slewed = t
+
      # Eval Sum and average
     y_avg = np.mean(y, axis=0, keepdims=True)
     y_slewed_avg = np.mean(y_slewed, axis=0, keepdims=True)
 
     # Extrapolate data if not sampled equally to match data lengths
     if len(t) < len(t_slewed):
-        interp_slew = interp1d(t_slewed, y_slewed_avg, kind='cubic', fill_value='extrapolate')
-        y_slewed_avg = interp_slew(t)
+        # integer oversampling, i.e. t is every r-th sample of t_slewed: decimate by indexing
+        r = (len(t_slewed) - 1)//max(len(t) - 1, 1)
+        dt = (t[-1] - t[0])/max(len(t) - 1, 1)
+        commensurate = r >= 1 and (len(t) - 1)*r < len(t_slewed) and \
+            np.allclose(t_slewed[:(len(t) - 1)*r + 1:r], t, rtol=0, atol=dt*1e-6)
+        if commensurate and anti_alias:  # anti-aliased polyphase resampling (zero-phase FIR)
+            y_slewed_avg = signal.resample_poly(y_slewed_avg, 1, r, axis=1)[:, :len(t)]
+        elif commensurate:
+            y_slewed_avg = y_slewed_avg[:, :(len(t) - 1)*r + 1:r]
+        else:
+            interp_slew = interp1d(t_slewed, y_slewed_avg, kind='cubic', fill_value='extrapolate')
+            y_slewed_avg = interp_slew(t)
 
     slew_error = y_slewed_avg - y_avg
     slew_error_rms = np.sqrt(np.mean(slew_error**2)) 
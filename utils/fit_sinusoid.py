@@ -63,25 +63,19 @@ def fit_sinusoid(x, y, fcn_alt):
     ygd = np.diff(yg)  # use difference for zero crossing detection
     
     # find zero crossing points from low to high (rising)
-    idx = []
-    for k in range(ygd.size):
-        if ygd[k] == 1:
-            idx.append(k)
+    idx = np.flatnonzero(ygd == 1)
 
-    x_zero_up = [x[i] for i in idx]  # pick timestamps at zero crossings
+    x_zero_up = x[idx]  # pick timestamps at zero crossings
     
     # guess the period as the average time intervals between rising zero crossings
     T_guess = np.mean(np.diff(x_zero_up))  # period guess (mean value of time between zero crossings)
     f_guess = 1/T_guess;  # frequency guess
     
     # find zero crossing points (rising and falling)
-    idx = []
-    for k in range(ygd.size):
-        if ygd[k] == 1 or ygd[k] == -1:
-            idx.append(k)
+    idx = np.flatnonzero(ygd != 0)
             
-    x_zero = [x[i] for i in idx]  # pick timestamps at zero crossings
-    d_zero = [ygd[i] for i in idx]  # pick gated output values at zero crossings
+    x_zero = x[idx]  # pick timestamps at zero crossings
+    d_zero = ygd[idx]  # pick gated output values at zero crossings
     
     # guessing the phase, this estimate is impacted by the Schitt trigger gate threshold
     if d_zero[0] == 1:
@@ -107,24 +101,87 @@ def fit_sinusoid(x, y, fcn_alt):
     return p_opt
 
 
+def freq_estimate_fft(x, y):
+    """
+    Frequency estimate from the peak of the spectrum of the (uniformly sampled)
+    signal, Hann windowed, with 3-point interpolation between the FFT bins.
+    """
+    N = y.size
+    Y = np.abs(np.fft.rfft((y - np.mean(y))*np.hanning(N)))
+    k = np.argmax(Y[1:-1]) + 1  # skip DC and Nyquist
+    delta = 2*(Y[k+1] - Y[k-1])/(Y[k-1] + 2*Y[k] + Y[k+1])  # bin offset (Hann window)
+    return (k + delta)/(N*(x[1] - x[0]))
+
+
+def fit_sinusoid_3p(x, y, f):
+    """
+    Three-parameter sine fit (known frequency), closed-form least squares
+    (IEEE Std 1057/1658). Returns the parameters of cos_sin_p: A0, B0, f, C0.
+    """
+    w = 2*np.pi*f*x
+    D = np.column_stack((np.cos(w), np.sin(w), np.ones(x.size)))
+    A0, B0, C0 = np.linalg.solve(D.T @ D, D.T @ y)
+    return np.array([A0, B0, f, C0])
+
+
+def fit_sinusoid_4p(x, y, f, max_iter=20, tol=1e-12):
+    """
+    Four-parameter sine fit (IEEE Std 1057/1658), iterating the linearised
+    least-squares problem in the frequency from the three-parameter fit at f.
+    The normal equations are column scaled for conditioning.
+    Returns the parameters of cos_sin_p: A0, B0, f0, C0.
+    """
+    A0, B0, f0, C0 = fit_sinusoid_3p(x, y, f)
+    w0 = 2*np.pi*f0
+    for _ in range(max_iter):
+        cw = np.cos(w0*x)
+        sw = np.sin(w0*x)
+        D = np.column_stack((cw, sw, np.ones(x.size), x*(B0*cw - A0*sw)))
+        scale = np.sqrt(np.sum(D**2, axis=0))
+        Dn = D/scale
+        A0, B0, C0, dw = np.linalg.solve(Dn.T @ Dn, Dn.T @ y)/scale
+        w0 = w0 + dw
+        if abs(dw) <= tol*abs(w0):
+            break
+    return np.array([A0, B0, w0/(2*np.pi), C0])
+
+
+def fit_sinusoid_ieee(x, y, n_param=4):
+    """
+    Sine fit with the IEEE Std 1057/1658 three- or four-parameter method, seeded from
+    an FFT-interpolated frequency estimate. Returns the parameters of sin_p: A, f, phi, C.
+    """
+    f_guess = freq_estimate_fft(x, y)
+    match n_param:
+        case 3:
+            A0, B0, f0, C0 = fit_sinusoid_3p(x, y, f_guess)
+        case 4:
+            A0, B0, f0, C0 = fit_sinusoid_4p(x, y, f_guess)
+    
+    # A0*cos + B0*sin = A*sin(. + 2*pi*phi)
+    A = np.hypot(A0, B0)
+    phi = (np.arctan2(A0, B0)/(2*np.pi)) % 1
+    return np.array([A, f0, phi, C0])
+
+
 def schmitt(x, thresholds):
     """
     Implement the behaviour of a Schmitt trigger.
+    The state is set at the samples crossing a threshold (going low takes
+    precedence) and held in between (forward fill of the last crossing).
     """ 
-    lim = 0  # store current state
-    yg = np.zeros(x.size)  # gated signal (output)
-    for k in range(x.size):
-        if (lim == 0):
-            yg[k] = 0
-        elif (lim == 1):
-            yg[k] = 1
-        # change state if signal crosses threshold (low or high)
-        if (x[k] <= thresholds[0]):  # going low
-            lim = 0
-            yg[k] = 0
-        elif (x[k] >= thresholds[1]):  # going high
-            lim = 1 
-            yg[k] = 1
+    x = np.asarray(x)
+    state = np.full(x.size, -1, dtype=np.int8)  # -1: no threshold crossing
+    state[x >= thresholds[1]] = 1  # going high
+    state[x <= thresholds[0]] = 0  # going low
+    if state.size and state[0] == -1:
+        state[0] = 0  # initial state (low)
+
+    # index of the last crossing at or before each sample
+    last = np.where(state >= 0, np.arange(x.size), 0)
+    np.maximum.accumulate(last, out=last)
+
+    yg = state[last].astype(float)  # gated signal (output)
     
     return yg
 
@@ -177,6 +234,17 @@ def main():
     y_mean = np.mean(y)
     y_std = np.std(y)
 
+    # Accuracy and speed of the IEEE 1057 fits compared to the curve fit (sin_p parameters)
+    import time
+    for name, fit in [('curve_fit', lambda: fit_sinusoid(x, y, 1)),
+                      ('IEEE 3-param.', lambda: fit_sinusoid_ieee(x, y, 3)),
+                      ('IEEE 4-param.', lambda: fit_sinusoid_ieee(x, y, 4))]:
+        t0 = time.perf_counter()
+        p_fit = fit()
+        dt = time.perf_counter() - t0
+        e_rms = np.sqrt(np.mean((y - sin_p(x, *p_fit))**2))
+        print(f'{name}: {dt*1e3:.2f} ms, p: {np.round(p_fit, 6)}, rms residual: {e_rms:.6g}')
+
     plt.plot(x, y, 'b-', label='input time-series')
 
     match fcn_alt:
@@ -33,18 +33,41 @@ def find_psd_peak(Pxx, f, EQNBW=1, f_find=-1):
         # throw an error here
         raise NameError('Invalid Arguments')
 
-    # step down the peak towards the left
-    k_left = k_max - 1
-    while k_left >= 0 and Pxx[k_left] <= Pxx[k_left + 1]:
-        k_left = k_left - 1
-    k_left = k_left + 1 # index to the left base of the peak
-    
-    # step down the peak towards the right
-    k_right = k_max + 1
-    while k_right < Pxx.size and Pxx[k_right] <= Pxx[k_right - 1]:
-        k_right = k_right + 1
-    k_right = k_right - 1 # index to the right base of the peak
+    k_left, k_right = psd_peak_bases(Pxx, k_max)
+
+    power, peak_f = psd_peak_power(Pxx, f, EQNBW, k_max, k_left, k_right)
     
+    return power, peak_f, k_max, k_left, k_right
+
+
+def psd_peak_bases(Pxx, k_max, k_dec=None, k_inc=None):
+    """
+    Indices of the left and right base of the peak at k_max, i.e. stepping the
+    index on both sides for as long as the power is decreasing (as in find_psd_peak()),
+    found from the indices where the PSD decreases (k_dec) and increases (k_inc):
+        k_dec = np.flatnonzero(np.diff(Pxx) < 0), k_inc = np.flatnonzero(np.diff(Pxx) > 0)
+    which can be passed in when finding several peaks in the same PSD.
+    """
+    if k_dec is None or k_inc is None:
+        dPxx = np.diff(Pxx)
+        k_dec = np.flatnonzero(dPxx < 0)
+        k_inc = np.flatnonzero(dPxx > 0)
+
+    # last decrease to the left of the peak
+    i = np.searchsorted(k_dec, k_max) - 1
+    k_left = k_dec[i] + 1 if i >= 0 else 0
+
+    # first increase to the right of the peak
+    i = np.searchsorted(k_inc, k_max)
+    k_right = k_inc[i] if i < k_inc.size else Pxx.size - 1
+
+    return int(k_left), int(k_right)
+
+
+def psd_peak_power(Pxx, f, EQNBW, k_max, k_left, k_right):
+    """
+    Power and (central moment) frequency of the peak at k_max with base indices k_left, k_right.
+    """
     # estimate a more exact frequency for the peak by computing the central moment of the peak
     f_ = f[k_left:k_right]
     Pxx_ = Pxx[k_left:k_right]
@@ -66,5 +89,69 @@ def find_psd_peak(Pxx, f, EQNBW=1, f_find=-1):
     if power < EQNBW*Pxx[k_max]:
         power = EQNBW*Pxx[k_max] # resort to using equivalent noise bandwidth to estimate power
         peak_f = f[k_max]
-    
-    return power, peak_f, k_max, k_left, k_right
+
+    return power, peak_f
+
+
+PSD_PEAK = np.dtype([('name', 'U8'), ('f', float), ('power', float), ('k_max', int), ('k_left', int), ('k_right', int)])
+
+
+def psd_harmonics(Pxx, f, Fs, EQNBW=1, K=5, spur_th=None):
+    """
+    Extract the DC component, the fundamental (largest peak), the harmonics 2 to K
+    (aliased into the first Nyquist zone) and the largest remaining spur from a
+    one-sided PSD estimate in one pass. If spur_th is given (in dB), all other peaks
+    with a peak PSD value less than spur_th below the fundamental's are included as spurs.
+
+    Returns a structured array (dtype PSD_PEAK) with one record per peak, named
+    'DC', 'F0', 'H2', ..., 'HK', 'SPUR', ... (frequency, power and peak indices).
+    """
+    dPxx = np.diff(Pxx)
+    k_dec = np.flatnonzero(dPxx < 0)
+    k_inc = np.flatnonzero(dPxx > 0)
+
+    free = np.ones(Pxx.size, dtype=bool)  # bins not part of a found peak
+    peaks = []
+
+    def add_peak(name, k_max):
+        k_left, k_right = psd_peak_bases(Pxx, k_max, k_dec, k_inc)
+        power, peak_f = psd_peak_power(Pxx, f, EQNBW, k_max, k_left, k_right)
+        free[k_left:k_right+1] = False
+        peaks.append((name, peak_f, power, k_max, k_left, k_right))
+        return peak_f
+
+    add_peak('DC', 0)
+    f0 = add_peak('F0', int(np.argmax(np.where(free, Pxx, -np.inf))))
+
+    for h in range(2, K + 1):
+        f_h = abs((h*f0 + Fs/2) % Fs - Fs/2)  # aliased harmonic frequency
+        k_find = int(np.argmin(np.abs(f - f_h)))
+        k_lo, k_hi = max(k_find - 1, 0), min(k_find + 2, Pxx.size)  # check neighbour values for a larger maximum
+        add_peak(f'H{h}', k_lo + int(np.argmax(Pxx[k_lo:k_hi])))
+
+    # largest remaining spur, and other peaks above the threshold
+    k_spur = int(np.argmax(np.where(free, Pxx, -np.inf)))
+    add_peak('SPUR', k_spur)
+    if spur_th is not None:
+        Pxx_th = Pxx[peaks[1][3]]*10**(-spur_th/10)
+        k_loc = np.flatnonzero((Pxx[1:-1] >= Pxx[:-2]) & (Pxx[1:-1] > Pxx[2:]) & (Pxx[1:-1] >= Pxx_th)) + 1
+        for k in k_loc[np.argsort(-Pxx[k_loc])]:
+            if free[k]:
+                add_peak('SPUR', int(k))
+
+    return np.array(peaks, dtype=PSD_PEAK)
+
+
+def thd_sfdr(peaks):
+    """
+    THD (harmonics relative to the fundamental, dBc) and SFDR (fundamental relative
+    to the largest harmonic or spur, dB) from the peaks found by psd_harmonics().
+    """
+    P_f0 = peaks['power'][peaks['name'] == 'F0'][0]
+    harm = np.char.startswith(peaks['name'], 'H')
+    spur = harm | (peaks['name'] == 'SPUR')
+
+    THD = 10*np.log10(np.sum(peaks['power'][harm])/P_f0)
+    SFDR = 10*np.log10(P_f0/np.max(peaks['power'][spur]))
+
+    return THD, SFDR
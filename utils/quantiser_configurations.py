@@ -13,6 +13,7 @@ from numpy import matlib
 import os
 from LM.lin_method_util import lm, dm
 import scipy
+import functools
 
 from utils.static_dac_model import quantiser_type
 from enum import Enum, auto
@@ -193,6 +194,14 @@ def quantiser_configurations(QConfig):
     return Nb, Mq, Vmin, Vmax, Rng, Qstep, YQ, Qtype
 
 
+@functools.lru_cache(maxsize=None)
+def load_levels_mat(path):
+    """
+    Load a level measurements MAT-file once per process (the arrays are only read from).
+    """
+    return scipy.io.loadmat(path)
+
+
 def get_ML(inpath, infile, CSV_filename):
     CSV_file = os.path.join(inpath, CSV_filename)
 
@@ -243,7 +252,7 @@ def get_measured_levels(QConfig:qs, lmethod=lm.BASELINE) -> np.ndarray:
                     Nb, Mq, Vmin, Vmax, Rng, Qstep, YQ, Qtype = quantiser_configurations(QConfig)
                     infile = 'level_measurements.mat'
                     if os.path.exists(os.path.join(inpath, infile)):
-                        mat_file = scipy.io.loadmat(os.path.join(inpath, infile))
+                        mat_file = load_levels_mat(os.path.join(inpath, infile))
                     else: # can't recover from this
                         raise SystemExit('No level measurements file found.')
                         #sys.exit('No level measurements file found.')
@@ -259,7 +268,7 @@ def get_measured_levels(QConfig:qs, lmethod=lm.BASELINE) -> np.ndarray:
                 case lm.PHYSCAL:
                     infile = 'PHYSCAL_level_measurements_set_2.mat'
                     if os.path.exists(os.path.join(inpath, infile)):
-                        mat_file = scipy.io.loadmat(os.path.join(inpath, infile))
+                        mat_file = load_levels_mat(os.path.join(inpath, infile))
                     else: # can't recover from this
                         raise SystemExit('No level measurements file found.')
 
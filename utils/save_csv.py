@@ -34,11 +34,20 @@ def save_enob_sinad_slew(QConfig:str, lin:str, Fx:int, Fc:int, ENOB:list, SINAD:
             np.savetxt(f, data, delimiter=',', fmt=format, header=header)
 
 def save_code(QConfig:str, lin:str, Fx:int, Fc:int, t, code, file:str='CODE', path:str='.\\results\\CODE\\'):       
-    filename = Path(f'{path}{file}_{QConfig}_{lin}_{str(Fx)}_{__get_timestamp_compact()}.csv')
-    header = f'Code @ Fx:{str(Fx)}Hz Fc:{str(Fc)}Hz' if not filename.exists() else ''
+    stem = f'{path}{file}_{QConfig}_{lin}_{str(Fx)}_{__get_timestamp_compact()}'
+    header = f'Code @ Fx:{str(Fx)}Hz Fc:{str(Fc)}Hz'
     format = ['%f', '%d']
-    with open(filename, 'w') as f:
-        np.savetxt(f, np.column_stack((t,code)), delimiter=',', fmt=format, header=header)
+    n = 0
+    while True:  # do not overwrite codes saved in the same second (e.g. by parallel sweep workers)
+        filename = Path(stem + (f'_{n}' if n else '') + '.csv')
+        try:
+            f = open(filename, 'x')
+        except FileExistsError:
+            n += 1
+            continue
+        with f:
+            np.savetxt(f, np.column_stack((t,code)), delimiter=',', fmt=format, header=header)
+        return
 
 def save_slew_error():
     # date_and_time = datetime.datetime.fromtimestamp(int(datetime.datetime.now(datetime.UTC).timestamp()), tz=datetime.UTC)
@@ -10,6 +10,12 @@
 import numpy as np
 from scipy import signal
 import tqdm
+import functools
+
+try:
+    import numba
+except ImportError:  # optional, the slew model kernel falls back to plain Python
+    numba = None
 
 class quantiser_type:
     midtread = 1
@@ -86,6 +92,40 @@ def slew_rate_rc(voltage):
         I_t[i] = min((V - V_t[i-1]) / R, I_max)
         V_t[i] = V_t[i-1] + I_t[i] * dt / C
 
+def _slew_linear_kernel(YS_scope, YS, t, t_scope, ts_scope, R):
+    """
+    Linear slew-rate limitation (slew_model mode 1), updating YS_scope in place, and
+    back-filling YS at the scope samples matching the DAC sample times t (with the
+    output of the last channel, as in the original per-sample implementation).
+    Scalar loops, suitable for JIT compilation.
+    """
+    F = -R # falling rate
+    atol = ts_scope/10
+    t_index = 1
+    V_t_dt = 0.0
+    for i in range(1, YS_scope.shape[1]):
+        for j in range(YS_scope.shape[0]):
+            rate = (YS_scope[j,i]-YS_scope[j,i-1])/ts_scope
+            if (rate > R):
+                V_t_dt = R * ts_scope  + YS_scope[j,i-1]
+            elif (rate < F):
+                V_t_dt = F * ts_scope + YS_scope[j,i-1]
+            else:
+                V_t_dt = YS_scope[j,i]
+            YS_scope[j,i] = V_t_dt
+
+        if t_index < t.size and abs(t[t_index] - t_scope[i]) <= atol:
+            for j in range(YS.shape[0]):
+                YS[j,t_index] = V_t_dt
+            t_index += 1
+
+
+if numba is not None:
+    _slew_linear_kernel_jit = numba.njit(cache=True)(_slew_linear_kernel)
+else:
+    _slew_linear_kernel_jit = _slew_linear_kernel
+
+
 def slew_model(y, ts, SR, t, ts_scope, mode=3):
     """
     Add slewing affect to a given DAC output signal.
@@ -133,58 +173,10 @@ def slew_model(y, ts, SR, t, ts_scope, mode=3):
         # Linear model
         case 1: 
             R = SR*1e6 # v/us to v/s
-            F = -R # falling rate
-            with tqdm.tqdm(range(1,YS_scope.shape[1]), desc='Slew limitation') as pbar:
-                for i in pbar:
-                    # V = YS_scope[:,i]
-                    rates = (YS_scope[:,i]-YS_scope[:,i-1])/ts_scope
-
-                    for j, rate in enumerate(rates):
-
-                    # delta_t = t1 - t0
-                    # rate = (u1 - u0)/delta_t
-
-                    # if rate + 1e-8 >= R:
-                    #     y = delta_t*R + u0
-                    # elif rate -1e-8 <= F: 
-                    #     y = delta_t*F + u0
-                    # elif rate <= R or rate >= F:
-                    #     y = u1
-
-
-                    # step_size = (YS_scope[:,i]-YS_scope[:,i])
-                    # R = slew_rate_lin2(abs(step_size))
-                    # step_size = (YS[:,i]-YS[:,i-1])
-                    # R = slew_rate_lin2(abs(step_size))
-                    # R = 
-                        # F = -R
-                        if (rate > R):
-                            V_t_dt = R * ts_scope  + YS_scope[j,i-1]
-                        elif (rate < F):
-                            V_t_dt = F * ts_scope + YS_scope[j,i-1]
-                        else:
-                            V_t_dt = YS_scope[j,i]
-                            # pass # y=u, vector is already copied above
-                        YS_scope[j,i] = V_t_dt
-
-                    # I_t_dt = np.minimum((V - YS_scope[:,i-1]) / R, I_max)
-                    # V_t_dt += I_t_dt * ts_scope / C
-                    # YS_scope[:,i] = V_t_dt
-                    if t_index < len(t) and np.isclose(t[t_index], t_scope[i], rtol=0, atol=ts_scope/10):
-                        YS[:,t_index] = V_t_dt
-                        t_index += 1
-            
-            # for i in range(1,YS.shape[1]):
-            #     rate = (YS[0,i]-YS[0,i-1])/ts
-            #     step_size = (YS[0,i]-YS[0,i-1])
-            #     R = slew_rate_lin2(abs(step_size))
-            #     F = -R
-            #     if (rate > R):
-            #         YS[0,i] = R * ts + YS[0,i-1]
-            #     elif (rate < F):
-            #         YS[0,i] = F * ts + YS[0,i-1]
-            #     else:
-            #         pass # y=u, vector is already copied above
+            YS_scope = np.ascontiguousarray(YS_scope, dtype=np.float64)
+            YS = np.ascontiguousarray(YS, dtype=np.float64)
+            _slew_linear_kernel_jit(YS_scope, YS, np.asarray(t, dtype=np.float64),
+                                    np.asarray(t_scope, dtype=np.float64), float(ts_scope), float(R))
 
             return YS, YS_scope, t_scope 
         
@@ -226,6 +218,158 @@ def slew_model(y, ts, SR, t, ts_scope, mode=3):
                         t_index += 1
             return YS, YS_scope, t_scope 
 
+def _slew_pwl_kernel(y, R_ts, V):
+    """
+    Start values V[:, k] of the ramps for linear slewing: each DAC update moves the
+    output towards y[:, k] by at most R_ts (slew rate times sample time).
+    """
+    for j in range(y.shape[0]):
+        v = y[j,0]
+        for k in range(y.shape[1]):
+            V[j,k] = v
+            d = y[j,k] - v
+            if d > R_ts:
+                d = R_ts
+            elif d < -R_ts:
+                d = -R_ts
+            v = v + d
+
+
+def _pwl_filter_kernel(tb, yb, ty, lam, b, c, d, Y):
+    """
+    Exact response of a (diagonalised) continuous-time LTI system, with modes
+    z' = lam*z + b*u and output y = Re(c@z) + d*u, to a piecewise-linear input
+    with breakpoints (tb, yb), zero initial state at tb[0], evaluated at times ty.
+    For a segment of length h with input u0 + s*sigma:
+        z(h) = exp(lam*h)*z(0) + b*(u0*phi1 + s*phi2),
+        phi1 = (exp(lam*h) - 1)/lam,  phi2 = (exp(lam*h) - 1 - lam*h)/lam**2
+    """
+    n = lam.size
+    M = tb.size
+    z = np.zeros(n, dtype=np.complex128)
+    i = 0  # current segment [tb[i], tb[i+1]]
+    tc = tb[0]  # current time
+    uc = yb[0]  # current input
+    for k in range(ty.size):
+        while True:
+            # segment end, and slope on the segment (hold after the last breakpoint)
+            if i + 1 < M:
+                te = tb[i+1]
+                s = (yb[i+1] - yb[i])/(tb[i+1] - tb[i]) if tb[i+1] > tb[i] else 0.0
+            else:
+                te = np.inf
+                s = 0.0
+            t_next = te if te < ty[k] else ty[k]
+
+            h = t_next - tc
+            if h > 0:
+                for m in range(n):
+                    lh = lam[m]*h
+                    e = np.exp(lh)
+                    if abs(lh) < 1e-4:  # series expansion (cancellation)
+                        phi1 = h*(1 + lh/2)
+                        phi2 = h*h*(0.5 + lh/6)
+                    else:
+                        phi1 = (e - 1)/lam[m]
+                        phi2 = (e - 1 - lh)/(lam[m]*lam[m])
+                    z[m] = e*z[m] + b[m]*(uc*phi1 + s*phi2)
+
+            if t_next == te and te <= ty[k]:  # move to the next segment
+                tc = te
+                uc = yb[i+1]
+                i += 1
+            else:
+                uc = uc + s*h
+                tc = t_next
+                break
+
+        acc = 0.0
+        for m in range(n):
+            acc += (c[m]*z[m]).real
+        Y[k] = acc + d*uc
+
+
+if numba is not None:
+    _slew_pwl_kernel_jit = numba.njit(cache=True)(_slew_pwl_kernel)
+    _pwl_filter_kernel_jit = numba.njit(cache=True)(_pwl_filter_kernel)
+else:
+    _slew_pwl_kernel_jit = _slew_pwl_kernel
+    _pwl_filter_kernel_jit = _pwl_filter_kernel
+
+
+def slew_model_pwl(y, ts, SR, t):
+    """
+    Linear slewing as an event-based, piecewise-linear (PWL) waveform, instead of
+    upsampled scope arrays (slew_model mode 1). As in slew_model, the output ramps
+    with the slew rate towards y[:, k] over the sample period ending at t[k], i.e.
+    from t[k] - ts, and holds the value when reached (or keeps ramping until t[k]).
+    At the scope sample times the waveform equals the slew_model mode 1 output.
+
+    Parameters
+    ----------
+    y
+        dac output signal, one channel per row
+    ts
+        time step (delta t)
+    SR
+        slew rate, in V/us
+    t
+        DAC update times
+
+    Returns
+    -------
+    tb, yb
+        breakpoint times and values, one channel per row, 2 breakpoints per sample
+        (the waveform is the linear interpolation of the breakpoints, e.g. np.interp)
+    """
+    R = SR*1e6 # v/us to v/s
+    y = np.ascontiguousarray(np.atleast_2d(y), dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[:y.shape[1]]
+
+    V = np.zeros(y.shape)  # ramp start values
+    _slew_pwl_kernel_jit(y, R*ts, V)
+
+    # ramp ends when the target is reached, or at the next update
+    W = np.empty(y.shape)  # ramp end values
+    W[:,:-1] = V[:,1:]
+    W[:,-1] = np.clip(y[:,-1], V[:,-1] - R*ts, V[:,-1] + R*ts)
+    tau = np.abs(W - V)/R
+
+    tb = np.empty((y.shape[0], 2*y.shape[1]))
+    yb = np.empty((y.shape[0], 2*y.shape[1]))
+    t_start = np.concatenate((t[:1], t[:-1]))  # previous update (y[:, 0] is held from t[0], V = W)
+    tb[:,0::2] = t_start
+    tb[:,1::2] = np.minimum(t_start + tau, t)
+    yb[:,0::2] = V
+    yb[:,1::2] = W
+
+    return tb, yb
+
+
+def reconstruction_filter_pwl(ty, tb, yb, Fc, Nf):
+    """
+    Exact output of the (analog Butterworth) reconstruction filter, as in
+    reconstruction_filter() case 1, for piecewise-linear inputs given by
+    breakpoints (tb, yb) from slew_model_pwl(), evaluated at the times ty.
+    """
+    Wc = 2*np.pi*Fc
+    b, a = signal.butter(Nf, Wc, 'lowpass', analog=True)  # filter coefficients
+
+    # modal (diagonal) realisation from the partial fraction expansion
+    r, lam, k = signal.residue(b, a)
+    c = r.astype(np.complex128)
+    b = np.ones(lam.size, dtype=np.complex128)
+    d = float(np.real(k[0])) if k.size else 0.0
+
+    ty = np.asarray(ty, dtype=np.float64)
+    y_avg = np.zeros((tb.shape[0], ty.size))
+    for i in range(tb.shape[0]):
+        _pwl_filter_kernel_jit(np.ascontiguousarray(tb[i]), np.ascontiguousarray(yb[i]), ty,
+                               lam.astype(np.complex128), b, c, d, y_avg[i])
+
+    return y_avg
+
+
 def test_slew_model():
     import matplotlib.pyplot as plt
     from pathlib import Path
@@ -311,16 +455,20 @@ def test_slew_model():
 
     plt.show()
 
-def generate_dac_output(C, ML):
+def generate_dac_output(C, ML, dtype=np.float64, out=None):
     """
     Table look-up to implement a simple static non-linear DAC model
 
     Parameters
     ----------
     C
-        input codes, one channel per row, must be integers, 2d array
+        input codes, one channel per row, must be integers (e.g. uint16), 2d array
     ML
         static DAC model output levels, one channel per row, 2d array
+    dtype
+        output data type (e.g. np.float32 to halve the memory)
+    out
+        optional preallocated output array, same shape as C (filled in place, returned)
 
     Returns
     -------
@@ -332,19 +480,22 @@ def generate_dac_output(C, ML):
         print(ML.shape[0])
         raise ValueError('Not enough channels in model.')
 
-    Y = np.zeros(C.shape)
-    
-    match 2:
-        case 1: # use loops
-            for k in range(0,C.shape[0]):
-                for j in range(0,C.shape[1]):
-                    c = C[k,j]
-                    ml = ML[k,c]
-                    Y[k,j] = ml
-        case 2: # use numpy indexing
-            for k in range(0,C.shape[0]):
-                Y[k,:] = ML[k,C[k,:]]
-    return Y
+    # levels in the output type, indexed by the codes for all channels at once
+    # (integer codes are used as indices directly, no upcasting copy)
+    ML = np.asarray(ML[:C.shape[0]], dtype=dtype if out is None else out.dtype)
+    if out is None:
+        return np.take_along_axis(ML, C, axis=1)
+
+    # written directly into the buffer in blocks (no full-size temporary, only the block's
+    # codes converted to indices); take() buffers the output when checking the indices,
+    # so the code range is checked here once
+    if C.size and (np.min(C) < 0 or np.max(C) >= ML.shape[1]):
+        raise IndexError('Codes out of the range of the model levels.')
+    block = 2**16
+    for k in range(C.shape[0]):
+        for i in range(0, C.shape[1], block):
+            np.take(ML[k], C[k, i:i+block], out=out[k, i:i+block], mode='clip')
+    return out
 
 def measurement_noise_range(Nb, Nb_measurement, Qstep, size):
     """
@@ -368,13 +519,43 @@ def measurement_noise_range(Nb, Nb_measurement, Qstep, size):
     ML_err_rng = Qstep/pow(2, Nb_measurement - Nb) # (try to emulate 18-bit measurements (add 12 bit))
     return np.random.uniform(-ML_err_rng, ML_err_rng, size)
 
-def reconstruction_filter(ty, y, Fc, Fs, Nf): # , print_results=True):
+@functools.lru_cache(maxsize=None)
+def reconstruction_filter_modes(Fc, Fs, Nf):
+    """
+    Modal (diagonal) realisation of the analog Butterworth reconstruction filter
+    discretised with zero-order hold (exact for DAC outputs held over 1/Fs):
+        z[k+1] = e*z[k] + g*u[k],  y[k] = Re(sum(c*z[k]))
+    with one first-order (complex) recursion per pole. Unlike a transfer function
+    (second-order sections), this stays well-conditioned when Fc << Fs, e.g. at
+    scope rates. Cached per (Fc, Fs, Nf).
+    """
+    Wc = 2*np.pi*Fc
+    _, p, k = signal.butter(Nf, Wc, 'lowpass', analog=True, output='zpk')  # all-pole, distinct poles
+    c = np.array([k/np.prod(p[m] - np.delete(p, m)) for m in range(p.size)])  # residues
+    e = np.exp(p/Fs)
+    g = np.expm1(p/Fs)/p
+    return e, g, c
+
+
+def reconstruction_filter(ty, y, Fc, Fs, Nf, mode=1): # , print_results=True):
     # Filter the output using a reconstruction (output) filter
+    #   mode 1 - analog filter (lsim), 2 - bilinear transform (lfilter),
+    #        3 - no filter, 4 - ZOH-discretised analog filter (modal recursions, all channels at once)
+    if isinstance(y, tuple):  # piecewise-linear breakpoints (tb, yb), see slew_model_pwl()
+        return reconstruction_filter_pwl(ty, *y, Fc, Nf)
+
+    if mode == 4:
+        e, g, c = reconstruction_filter_modes(float(Fc), float(Fs), int(Nf))
+        y_avg = np.zeros(y.shape)
+        for m in range(e.size):
+            y_avg += (c[m]*signal.lfilter([0, g[m]], [1, -e[m]], y, axis=1)).real
+        return y_avg
+
     y_avg = np.zeros(y.shape)
     with tqdm.tqdm(range(y_avg.shape[0]), desc='Reconstruction filter') as pbar:
         for i in pbar:
             y_ch = y[i,:].reshape(-1, 1)  # ensure the vector is a column vector
-            match 1:
+            match mode:
                 case 1:
                     Wc = 2*np.pi*Fc
                     b, a = signal.butter(Nf, Wc, 'lowpass', analog=True)  # filter coefficients
@@ -392,4 +573,51 @@ def reconstruction_filter(ty, y, Fc, Fs, Nf): # , print_results=True):
 
     return y_avg
 
-# test_slew _model()
\ No newline at end of file
+
+
+def main():
+    """
+    Check the numerical equivalence of the ZOH-discretised (modal, mode 4) and the analog (lsim) reconstruction
+    filter, at the DAC and at scope rates, and of the piecewise-linear and the scope array (mode 1) slew models.
+    """
+    import time
+
+    Fs = 1e6
+    t = np.arange(0, 2e-3, 1/Fs)
+    y = np.vstack([np.round(100*np.sin(2*np.pi*5e3*t))/100, np.round(100*np.cos(2*np.pi*5e3*t))/100])
+
+    for Fs_filt in [Fs, 1e7, 1e8, 1e9]:
+        t_filt = np.arange(0, 2e-4, 1/Fs_filt)
+        y_filt = y[:, np.floor(t_filt*Fs + 1e-6).astype(int)]  # DAC output held at the filter rate
+        for Fc, Nf in [(1e5, 1), (1e5, 3), (1e5, 5), (2e4, 5)]:
+            t0 = time.perf_counter()
+            y_lsim = reconstruction_filter(t_filt, y_filt, Fc, Fs_filt, Nf, mode=1)
+            dt_lsim = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            y_zoh = reconstruction_filter(t_filt, y_filt, Fc, Fs_filt, Nf, mode=4)
+            dt_zoh = time.perf_counter() - t0
+            err = np.max(np.abs(y_lsim - y_zoh))
+            print(f'Fs={Fs_filt:g}, Fc={Fc:g}, Nf={Nf}: max abs. difference {err:.2e} (within 1e-9: {err < 1e-9}), '
+                  f'lsim {dt_lsim*1e3:.1f} ms, mode 4 {dt_zoh*1e3:.2f} ms')
+
+    # piecewise-linear slewing against the scope arrays of slew_model mode 1
+    Fs_scope = 1e8
+    y = 5*y + np.random.default_rng(1).uniform(-0.5, 0.5, y.shape)
+    for SR in [1e6, 7]:
+        _, YS_scope, t_scope = slew_model(y, 1/Fs, SR, t, 1/Fs_scope, mode=1)
+        tb, yb = slew_model_pwl(y, 1/Fs, SR, t)
+        # at the DAC sample times (as in eval_slew_distortion), and at the scope sample times
+        # unless the ramps are so steep that the rounding of the time grids shows (SR*1e6*1e-19 V)
+        YS_pwl = np.array([np.interp(t, tb_ch, yb_ch) for tb_ch, yb_ch in zip(tb, yb)])
+        err = np.max(np.abs(YS_pwl - YS_scope[:, ::round(Fs_scope/Fs)]))
+        if SR < 1e3:
+            YS_pwl = np.array([np.interp(t_scope, tb_ch, yb_ch) for tb_ch, yb_ch in zip(tb, yb)])
+            err = max(err, np.max(np.abs(YS_pwl - YS_scope)))
+        print(f'SR={SR:g} V/us: PWL max abs. difference to slew_model {err:.2e} (within 1e-9: {err < 1e-9})')
+
+
+# test_slew _model()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@
 """
 
 import numpy as np
+import hashlib
+from enum import Enum
 from prefixed import Float
 
 
@@ -43,6 +45,26 @@ def test_signal_square(SCALE, MAXAMP, FREQ, OFFSET, t):
     """
     return (SCALE/100)*MAXAMP*np.sign(np.sin(2*np.pi*FREQ*t)) + OFFSET
 
+def canonical_value(v):
+    """
+    Canonical text of a configuration value: numbers at full precision (the same for
+    int and float of equal value), enums by name, arrays by a digest of dtype, shape and data.
+    """
+    if v is None or isinstance(v, (bool, np.bool_, str)):
+        return repr(v)
+    if isinstance(v, Enum):
+        return f'{type(v).__name__}.{v.name}'
+    if isinstance(v, (int, float, np.integer, np.floating)):
+        return repr(float(v))
+    if isinstance(v, (np.ndarray, list, tuple)):
+        a = np.ascontiguousarray(v)
+        if a.dtype == object:
+            return '[' + ','.join(canonical_value(x) for x in a.ravel()) + ']'
+        digest = hashlib.sha1(a.view(np.uint8) if a.size else b'').hexdigest()
+        return f'{a.dtype.str}{a.shape}:{digest}'
+    return str(v)
+
+
 class sim_config:
     def __init__(self, qconfig, lin, dac, fs, t, fc, nf, ref_scale, ref_freq, ncyc, sr, xref, fs_scope, nch=1):
         self.qconfig = qconfig
@@ -77,3 +99,22 @@ class sim_config:
         s = s + 'Nch=' + f'{Float(self.nch):.0h}' + '\n'
 
         return s
+
+    def fingerprint(self, **extra):
+        """
+        Canonical, complete text of the configuration (see canonical_value()), with extra
+        settings that determine the codes (e.g. seed, method parameters, measured levels).
+        ref_scale and nch are left out; they are set by the methods from these settings.
+        """
+        fields = dict(qconfig=self.qconfig, lin=self.lin, dac=self.dac, fs=self.fs, t=self.t, fc=self.fc,
+                      nf=self.nf, ref_freq=self.ref_freq, ncyc=self.ncyc, sr=self.sr, xref=self.xref,
+                      fs_scope=self.fs_scope)
+        s = ''.join(f'{key}={canonical_value(value)}\n' for key, value in fields.items())
+        s = s + ''.join(f'{key}={canonical_value(extra[key])}\n' for key in sorted(extra))
+        return s
+
+    def digest(self, **extra):
+        """
+        SHA-1 hash of the fingerprint() (used as the key of the generated codes).
+        """
+        return hashlib.sha1(self.fingerprint(**extra).encode('utf-8')).hexdigest()
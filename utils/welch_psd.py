@@ -62,6 +62,148 @@ def welch_psd(x, L, Fs=1.0, ONE_SIDED=1):
     
     return Pxx, f
 
+def welch_psd_batch(X, L, Fs=1.0, ONE_SIDED=1):
+    """
+    Batched welch_psd(): PSD estimates for every row of a 2-D input
+    (e.g. one channel or run per row), with all segments of all rows
+    windowed by broadcasting and transformed by a single real FFT.
+    X - input time-series, 1-D or 2-D (batch, N)
+    L - number of averages
+    Fs - Samping frequency
+    ONE_SIDED - return one-sided spectrum (default)
+
+    Returns Pxx with one PSD per row (batch, number of frequencies), and f
+    """
+
+    X = np.atleast_2d(X)
+    B, N = X.shape # batch size, length of original sequences
+    M = math.floor(N/L) # length of sequence segments
+    f = np.arange(0, 1, 1/M) # normalized PSD frequencies
+
+    WIN = np.kaiser(M, 38) # Kaiser window for large dynamic range
+
+    X = X - np.mean(X, axis=1, keepdims=True) # remove mean value to minimise DC component
+
+    # (batch, L, M) segments, windowed and transformed at once
+    Xft = np.fft.rfft(X[:, :L*M].reshape(B, L, M)*WIN, axis=2)
+    Pxx = np.sum(np.abs(Xft)**2, axis=1)/(2*math.pi*M) # averaging the auto-correlation PSD
+
+    Pwin = np.sum(np.abs(WIN)**2)/M # window "power" correction (for Welch method)
+    Pxx = Pxx/(L*Pwin) # scale and correct average
+
+    # One-sided spectrum (real input, the negative frequencies are the mirrored positive ones)
+    if ONE_SIDED:
+        f = np.array_split(f, 2)[0]
+        Pxx = 2*Pxx[:, :f.size]
+    else:
+        Pxx = np.concatenate((Pxx, Pxx[:, 1:M - Pxx.shape[1] + 1][:, ::-1]), axis=1)
+
+    Pxx = Pxx/(Fs/(2*np.pi))
+    f = f*Fs
+
+    return Pxx, f
+
+
+class psd_accumulator:
+    """
+    Streaming version of welch_psd(): segments of length M are windowed,
+    transformed and summed as the data is fed in chunks (update()), such that only
+    one segment is held in memory. The mean value of all fed samples is removed
+    exactly at the end, using the summed segment spectra:
+        |F(w*(x - mu))|^2 = |F(w*x)|^2 - 2*mu*Re(conj(F(w*x))*F(w)) + mu^2*|F(w)|^2
+    """
+
+    def __init__(self, M, L=None):
+        """
+        M - length of sequence segments
+        L - maximum number of averages (None: use all complete segments)
+        """
+        self.M = M
+        self.L = L
+        self.WIN = np.kaiser(M, 38) # Kaiser window for large dynamic range
+        self.Wft = np.fft.rfft(self.WIN)
+        self.Sxx = np.zeros(self.Wft.size) # sum of squared magnitude spectra
+        self.Sx = np.zeros(self.Wft.size, dtype=complex) # sum of spectra
+        self.n_seg = 0 # number of segments
+        self.x_sum = 0.0 # sum of all samples (for the mean value)
+        self.n_x = 0 # number of samples
+        self.buf = np.zeros(M) # current segment
+        self.n_buf = 0
+
+    def update(self, x):
+        """
+        Feed the next chunk of the time-series (any length, e.g. from a generator or memory-mapped array).
+        """
+        x = np.asarray(x, dtype=float).ravel()
+        self.x_sum += np.sum(x)
+        self.n_x += x.size
+
+        k = 0
+        while k < x.size and (self.L is None or self.n_seg < self.L):
+            n = min(self.M - self.n_buf, x.size - k)
+            self.buf[self.n_buf:self.n_buf+n] = x[k:k+n]
+            self.n_buf += n
+            k += n
+            if self.n_buf == self.M: # complete segment
+                Xft = np.fft.rfft(self.buf*self.WIN)
+                self.Sxx += np.abs(Xft)**2
+                self.Sx += Xft
+                self.n_seg += 1
+                self.n_buf = 0
+
+    def psd(self, Fs=1.0, ONE_SIDED=1):
+        """
+        PSD estimate Pxx, f from the segments fed so far (scaled as welch_psd()).
+        """
+        M = self.M
+        L = self.n_seg
+        mu = self.x_sum/self.n_x # mean value
+
+        # remove mean value to minimise DC component
+        Pxx = self.Sxx - 2*mu*np.real(np.conj(self.Sx)*self.Wft) + L*mu**2*np.abs(self.Wft)**2
+        Pxx = Pxx/(2*math.pi*M)
+
+        Pwin = np.sum(np.abs(self.WIN)**2)/M # window "power" correction (for Welch method)
+        Pxx = Pxx/(L*Pwin) # scale and correct average
+
+        f = np.arange(0, 1, 1/M) # normalized PSD frequencies
+
+        # One-sided spectrum (real input, the negative frequencies are the mirrored positive ones)
+        if ONE_SIDED:
+            f = np.array_split(f, 2)[0]
+            Pxx = 2*Pxx[:f.size]
+        else:
+            Pxx = np.concatenate((Pxx, Pxx[1:M - Pxx.size + 1][::-1]))
+
+        Pxx = Pxx/(Fs/(2*np.pi))
+        f = f*Fs
+
+        return Pxx, f
+
+
+def welch_psd_stream(x, L, Fs=1.0, ONE_SIDED=1, N=None):
+    """
+    welch_psd() for time-series that do not fit in memory:
+    x - memory-mapped array (or array), read segment by segment,
+        or an iterable of chunks (e.g. a generator), then N must be given
+    L - number of averages
+    N - length of the time-series (default x.size)
+    """
+    if N is None:
+        N = x.size
+    M = math.floor(N/L) # length of sequence segments
+
+    acc = psd_accumulator(M, L)
+    if isinstance(x, np.ndarray):
+        for k in range(0, x.size, M):
+            acc.update(x[k:k+M])
+    else:
+        for x_chunk in x:
+            acc.update(x_chunk)
+
+    return acc.psd(Fs, ONE_SIDED)
+
+
 def main():
     """
     Test the method and compare to SciPy library
@@ -79,6 +221,18 @@ def main():
 
     f_cmp, Pxx_cmp = signal.welch(x, fs=Fs, nperseg=t.size/10) # compare to library
 
+    # compare the batched version (for a batch of 8 channels)
+    import time
+    X = np.stack([x + 0.01*np.random.randn(t.size) for _ in range(8)])
+    t0 = time.perf_counter()
+    Pxx_loop = np.stack([welch_psd(X[k], 10, Fs)[0] for k in range(X.shape[0])])
+    dt_loop = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    Pxx_batch, f_batch = welch_psd_batch(X, 10, Fs)
+    dt_batch = time.perf_counter() - t0
+    print(f'loop: {dt_loop*1e3:.1f} ms, batched: {dt_batch*1e3:.1f} ms, '
+          f'max rel. difference: {np.max(np.abs(Pxx_batch - Pxx_loop)/Pxx_loop):.2e}')
+
     plt.loglog(f, Pxx, lw=0.5)
     plt.loglog(f_cmp, Pxx_cmp, lw=0.5)
     plt.ylim([1e-13, 1])